@@ -0,0 +1,58 @@
+"""Cache of parsed files"""
+
+import glob
+import hashlib
+import os
+import threading
+import pandas as pd
+
+
+PATH_CACHE = r'.\common\files\cache'  # parquet копии разобранных файлов между запусками
+MEMORY_CACHE = dict()  # разобранные файлы в рамках запуска {(путь, mtime, размер): pd.DataFrame}
+CACHE_LOCK = threading.Lock()  # загрузки выполняются в потоках, файл должен разбираться один раз
+
+
+def read_excel_cached(path1) -> pd.DataFrame:
+    """
+    Читает первый лист файла ексель целиком, разбирая файл не больше одного раза, пока он не изменится.
+    Ключ кэша - путь, время изменения и размер файла. Разобранная таблица хранится в памяти на время запуска
+    и в parquet файле в PATH_CACHE между запусками (если parquet не удалось записать, например нет pyarrow,
+    то остается только кэш в памяти)
+
+    :arg path1 - путь к файлу ексель
+    :return pd.DataFrame - копия таблицы, ее можно изменять
+    """
+    stat = os.stat(path1)
+    key = (os.path.abspath(path1), stat.st_mtime_ns, stat.st_size)
+    with CACHE_LOCK:
+        if key not in MEMORY_CACHE:
+            MEMORY_CACHE[key] = read_parquet_or_excel(*key)
+        return MEMORY_CACHE[key].copy()
+
+
+def read_parquet_or_excel(path1, mtime1, size1) -> pd.DataFrame:
+    """
+    Читает таблицу из parquet копии файла, если она есть для текущей версии файла,
+    иначе разбирает файл ексель и сохраняет parquet копию, удаляя копии прошлых версий
+
+    :arg path1 - абсолютный путь к файлу ексель
+    :arg mtime1 - время изменения файла в наносекундах
+    :arg size1 - размер файла в байтах
+    """
+    name = hashlib.md5(path1.encode('utf-8')).hexdigest()
+    path_parquet = os.path.join(PATH_CACHE, f'{name}_{mtime1}_{size1}.parquet')
+    if os.path.exists(path_parquet):
+        try:
+            return pd.read_parquet(path_parquet)
+        except Exception:  # битая копия или нет pyarrow - разбираем файл заново
+            pass
+
+    table = pd.read_excel(path1)
+    try:
+        os.makedirs(PATH_CACHE, exist_ok=True)
+        for i in glob.glob(os.path.join(PATH_CACHE, f'{name}_*.parquet')):
+            os.remove(i)
+        table.to_parquet(path_parquet)
+    except Exception:  # кэш между запусками необязателен
+        pass
+    return table
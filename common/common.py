@@ -3,61 +3,50 @@
 import datetime as dt
 import logging
 import os
+import re
+import numpy as np
 import pandas as pd
 
 from datetime import time
 
+TASK_PATTERN = re.compile(r"ССЗ\s*№\s*(\d+)(?=[^\\/]*$)")  # номер задания, только в имени файла
+CARD_PATTERN = re.compile(r"карта\s*№\s*(\d+)(?=[^\\/]*$)")  # номер карты, только в имени файла
+OPERATOR_PATTERN = re.compile(r"\\(\d)\\")  # номер оператора - папка из одной цифры
 
-def check_func(foo, arg=None):
+
+def log_down(name1):
     """
-    Пытается исполнить функцию foo, если не удаются, то пишет в "..\LOG_LOAD_DB.log" сообщение о падении
+    Пишет в "..\LOG_LOAD_DB.log" сообщение о падении
 
     :arg
-        foo - исполняемая функция
-        arg - должен быть формата (x,) или (x1,x2)
-    """
-    if arg is None:
-        try:
-            foo()
-        except:
-            logging.basicConfig(
-                level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
-                filename=r".\LOG_LOAD_DB.log"
-            )
-            logging.info(f"{foo.__name__} was down")
-    else:
-        try:
-            foo(*arg)
-        except:
-            logging.basicConfig(
-                level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
-                filename=r".\LOG_LOAD_DB.log"
-            )
-            logging.info(f"{foo.__name__} was down")
+        name1 - наименование упавшей функции
+    """
+    log_message(f"{name1} was down")
 
 
-def parse_date_point(x1):
+def log_message(message1):
     """
-    Парсит даты типа 01012019 и преобразует в datetime.datetime
+    Пишет сообщение в "..\LOG_LOAD_DB.log"
 
     :arg
-        x1 - string like '01012019'
+        message1 - текст сообщения
     """
-    date = x1.replace('.', '')
-    return dt.datetime(year=int(date[4:]), month=int(date[2:4]), day=int(date[:2]))
+    logging.basicConfig(
+        level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+        filename=r".\LOG_LOAD_DB.log"
+    )
+    logging.info(message1)
 
 
-def to_datetime_in_list(table1, n1):
+def parse_date_point(x1):
     """
-    Функция принимает numpy.array и на месте n1 преобразовывает pandas.Timestamp в datetime
+    Парсит даты типа 01012019 и преобразует в datetime.datetime
 
     :arg
-        table1 - таблица в виде numpy.array (как список из списков)
-        n1 - место в итерируемом списке
-        """
-    for i in table1:
-        i[n1] = dt.datetime.fromtimestamp(dt.datetime.timestamp(i[n1]))
-    return table1
+        x1 - string like '01012019'
+    """
+    date = x1.replace('.', '')
+    return dt.datetime(year=int(date[4:]), month=int(date[2:4]), day=int(date[:2]))
 
 
 def parse_date_path(path1):
@@ -119,22 +108,93 @@ def def_smena(dt1):
         return 2
 
 
-def date_range(series1):
+def true_dates(series1, border1=time(hour=8)) -> pd.Series:
+    """
+    Векторная true_date: определяет дату со сдвигом для всего столбца сразу,
+    время до border1 относится к предыдущему дню
+
+    :param series1: pd.Series (или numpy.array) с datetime
+    :param border1: dt.time начало производственных суток
+    :return: pd.Series с dt.date
+    """
+    values = pd.Series(pd.to_datetime(series1))
+    return (values - time_to_timedelta(border1)).dt.date
+
+
+def def_smenas(series1, low_border1=time(hour=8), high_border1=time(hour=20)) -> pd.Series:
+    """
+    Векторная def_smena: определяет смену для всего столбца сразу по времени суток,
+    1 смена с low_border1 до high_border1 (не включая), иначе 2 смена
+
+    :param series1: pd.Series (или numpy.array) с datetime
+    :param low_border1: dt.time начало 1 смены
+    :param high_border1: dt.time конец 1 смены
+    :return: pd.Series с номерами смен 1 и 2
+    """
+    values = pd.Series(pd.to_datetime(series1))
+    time_of_day = values - values.dt.normalize()
+    first = (time_of_day >= time_to_timedelta(low_border1)) & (time_of_day < time_to_timedelta(high_border1))
+    return pd.Series(np.where(first, 1, 2), index=values.index)
+
+
+def time_to_timedelta(time1) -> pd.Timedelta:
+    """
+    Переводит dt.time во время от начала суток
+
+    :param time1: объект dt.time
+    :return: pd.Timedelta
     """
-    Принимает pd.Series преобразовывает в pd.DataFrame, если пропущены даты, то заполняет их и определяет верхнуюю
-    границу каксегодняшнее число, однако сегодняшнее число невходит в итоговый tuple (так как утром делается за
-    предыдущие дни)
+    return pd.Timedelta(hours=time1.hour, minutes=time1.minute, seconds=time1.second, microseconds=time1.microsecond)
+
 
-    :param series1: pd.Series с dates
-    :return: pd.DataFrame для мержа с остальными данными
+def plazma_path_numbers(path_in1, path1) -> pd.DataFrame:
     """
-    min_date = series1.min()
-    max_date = dt.datetime.now().date()
-    tuple_dt = []
-    i = min_date
-    while i < max_date:
-        tuple_dt.append(i)
-        i += dt.timedelta(days=1)
+    Достает номера из путей карт по плазме сразу для всего столбца:
+    номер задания и номер карты ищутся только в имени файла path_in1 (если не найдены, то 0),
+    номер оператора - папка из одной цифры в пути path1 (если не найден, то <NA>)
 
-    table = pd.DataFrame(data=((d, s) for d in tuple_dt for s in (1, 2)), columns=['date', 'smena'])
+    :param path_in1: pd.Series с полными путями к файлам из ячейки самой карты
+    :param path1: pd.Series с полными путями к файлам карт
+    :return: pd.DataFrame с колонками 'n_task', 'n_card', 'operator' типа Int64
+    """
+    path_in1 = pd.Series(path_in1).astype('string')
+    path1 = pd.Series(path1, index=path_in1.index).astype('string')
+    table = pd.DataFrame(index=path_in1.index)
+    table['n_task'] = extract_int(path_in1, TASK_PATTERN).fillna(0)
+    table['n_card'] = extract_int(path_in1, CARD_PATTERN).fillna(0)
+    table['operator'] = extract_int(path1, OPERATOR_PATTERN)
     return table
+
+
+def extract_int(series1, pattern1) -> pd.Series:
+    """
+    Достает число из первой группы регулярного выражения для всего столбца
+
+    :param series1: pd.Series со строками
+    :param pattern1: скомпилированное регулярное выражение с одной группой
+    :return: pd.Series типа Int64, <NA> если совпадения нет
+    """
+    return pd.to_numeric(series1.str.extract(pattern1, expand=False)).astype('Int64')
+
+
+def date_grid(dates1, smenas1=2, end_date1=None):
+    """
+    Строит сетку дат (и смен) без пропусков для reindex итоговых таблиц: от минимальной даты dates1
+    до вчерашнего дня включительно (сегодняшний день не входит, так как утром отчет делается за предыдущие дни)
+
+    :param dates1: pd.Series (или список) с датами dt.date / datetime
+    :param smenas1: кол-во смен в дне, 0 - сетка только по датам
+    :param end_date1: последняя дата сетки, None - вчерашний день
+    :return: pd.MultiIndex (date, smena) или pd.DatetimeIndex date, если smenas1 = 0, даты в datetime64
+    """
+    dates = pd.to_datetime(pd.Series(dates1)).dropna()
+    if end_date1 is None:
+        end_date1 = dt.date.today() - dt.timedelta(days=1)
+
+    if len(dates):
+        days = pd.date_range(dates.min().normalize(), pd.Timestamp(end_date1), freq='D', name='date')
+    else:
+        days = pd.DatetimeIndex([], name='date')
+    if not smenas1:
+        return days
+    return pd.MultiIndex.from_product([days, range(1, smenas1 + 1)], names=['date', 'smena'])
@@ -1,33 +1,104 @@
 """Working with database"""
 
 import datetime as dt
+import os
 import sqlite3 as sql
+import threading
+import time
+import numpy as np
 import pandas as pd
 
+from common.common import log_message
 from common.error import StartEndDateError
 from pypyodbc import connect
 
 
-def conn_bd_oemz() -> sql.connect:
+PATH_BD_OEMZ = r"\\oemz-fs01.oemz.ru\Works$\Analytics\Database\bd_oemz.bd3"
+CONNECTIONS = threading.local()  # открытые соединения текущего потока {read_only: (pid, sqlite3.connection)}
+CONN_STATS = {'opened': 0, 'reused': 0}  # сколько соединений открыто и сколько открытий сэкономлено
+CONN_STATS_LOCK = threading.Lock()
+LOADS_TODAY = dict()  # кэш сегодняшних загрузок из records_of_loads {'date': dt.date, 'loads': {...}}
+LOADS_TODAY_LOCK = threading.Lock()
+SHIFT_SOURCES = {
+    'vp_164': ('vp_164', 'c_0', 'c_9', 'CASE WHEN c_7 > 600 THEN 0 ELSE c_7 END', 'c_17 = 2', 'NULL', 'NULL'),
+    'vpx_94': ('vpx_94', 'c_0', 'c_9', 'CASE WHEN c_7 > 600 THEN 0 ELSE c_7 END', 'c_17 = 2', 'NULL', 'NULL'),
+    'vp_184': ('vp_184', 'c_0', 'c_9', 'CASE WHEN c_7 > 600 THEN 0 ELSE c_7 END', '0', 'NULL', 'NULL'),
+    'plazma': ('plazma_cards', 'dt_change', 'mass', 'cut_time + move_time + stub_time', '0', '1', 'mass * umc'),
+}  # источник итогов по сменам: (таблица, время, масса, секунды операций, начало плети, карта, масса * umc)
+PLET_STARTS = {
+    'vp_164': 'c_17 = 2',
+    'vpx_94': 'c_17 = 2',
+}  # станки с плетями: операции плети относятся к смене начала плети, как в prep_detail_vptable
+
+
+def conn_bd_oemz(read_only1=False) -> sql.connect:
     """
-    Подключается к базе bd_oemz.bd3
+    Возвращает соединение к базе bd_oemz.bd3. Соединение открывается один раз на поток и процесс
+    (каждое открытие идет по SMB и перечитывает схему) и дальше переиспользуется, pragma применяются при открытии.
+    Вложенный "with conn_bd_oemz() as conn" в том же потоке получает то же соединение,
+    поэтому выход из вложенного with делает commit
+
+    :param read_only1: True - отдельное соединение только для чтения (PRAGMA query_only) для запросов отчетов
     """
+    conns = getattr(CONNECTIONS, 'conns', None)
+    if conns is None:
+        conns = CONNECTIONS.conns = dict()
+    pid, conn = conns.get(read_only1, (None, None))
+    if conn is not None and pid == os.getpid():  # после fork соединение родителя не используется
+        with CONN_STATS_LOCK:
+            CONN_STATS['reused'] += 1
+        return conn
+
     conn = sql.connect(
-        r"\\oemz-fs01.oemz.ru\Works$\Analytics\Database\bd_oemz.bd3",
-        detect_types=sql.PARSE_COLNAMES | sql.PARSE_DECLTYPES
+        PATH_BD_OEMZ,
+        detect_types=sql.PARSE_COLNAMES | sql.PARSE_DECLTYPES,
+        timeout=60  # загрузки выполняются одновременно, ждем пока другая загрузка закончит запись
     )
+    set_pragmas(conn, PATH_BD_OEMZ)
+    if read_only1:
+        conn.execute("""PRAGMA query_only = ON""")
+    conns[read_only1] = (os.getpid(), conn)
+    with CONN_STATS_LOCK:
+        CONN_STATS['opened'] += 1
     return conn
 
 
+def connection_stats() -> dict:
+    """Возвращает кол-во открытых соединений к bd_oemz.bd3 и сэкономленных открытий в текущем процессе"""
+    with CONN_STATS_LOCK:
+        return dict(CONN_STATS)
+
+
+def set_pragmas(conn1, path1) -> None:
+    """
+    Настраивает соединение: кэш страниц 64 Мб и временные таблицы в памяти.
+    WAL и synchronous=NORMAL включаются только для локального файла базы,
+    на сетевом диске WAL не работает (нужна общая память между процессами)
+
+    :param conn1: объект sqlite3.connection
+    :param path1: путь к файлу базы
+    """
+    conn1.execute("""PRAGMA cache_size = -65536""")
+    conn1.execute("""PRAGMA temp_store = MEMORY""")
+    if not path1.startswith('\\\\'):
+        conn1.execute("""PRAGMA journal_mode = WAL""")
+        conn1.execute("""PRAGMA synchronous = NORMAL""")
+
+
 def load_data_from_db(
         table_name1,
         cols_name1,
         date_col=None,
         start_date=None,
-        end_date=None
-) -> pd.DataFrame:
+        end_date=None,
+        chunksize1=100000,
+        iterator1=False
+):
     """
-    Универсальная функция для загрузки данных из базы для простого запроса
+    Универсальная функция для загрузки данных из базы для простого запроса.
+    Даты передаются в запрос параметрами, строки читаются частями по chunksize1 через fetchmany,
+    каждая часть сразу приводится к типам по объявленным типам столбцов (TIMESTAMP/DATE - datetime64,
+    REAL - float64, INTEGER - int64 или float64 если есть пропуски), даты разбираются pandas целым столбцом
 
     :param table_name1: наименование таблицы в базе bd_oemz.bd3 в формате str
     :param cols_name1: список нужных столбцов в формате list
@@ -35,23 +106,72 @@ def load_data_from_db(
     :param start_date: дата начала выборки в формате dt.datetime
     :param end_date: дата конца выборки в формате dt.datetime (что бы выбрать включительно 2019.01.01,
     нужно либо dt.datetime(2019,1,2) либо dt.datetime(2019,1,2,23,59,59)
+    :param chunksize1: кол-во строк в одной части
+    :param iterator1: True - вернуть итератор по частям pd.DataFrame вместо одной таблицы
     :raise: если date_col, start_date, end_date не все заполнены
+    :return: pd.DataFrame или итератор pd.DataFrame, если iterator1
     """
-    with conn_bd_oemz() as conn:
+    if start_date is None and end_date is None and date_col is None:
+        where, params = '', ()
+    elif start_date is not None and end_date is not None and date_col is not None:
+        where = f"""WHERE {date_col} BETWEEN ? and ?"""
+        params = (start_date.strftime("%Y-%m-%d %H:%M:%S"), end_date.strftime("%Y-%m-%d %H:%M:%S"))
+    else:
+        raise StartEndDateError
+
+    chunks = iter_data_from_db(table_name1, cols_name1, where, params, chunksize1)
+    if iterator1:
+        return chunks
+    data = list(chunks)
+    return pd.concat(data, ignore_index=True) if len(data) > 1 else data[0]
+
+
+def iter_data_from_db(table_name1, cols_name1, where1, params1, chunksize1):
+    """
+    Выполняет запрос для load_data_from_db и отдает результат частями pd.DataFrame с приведенными типами,
+    всегда отдает хотя бы одну (возможно пустую) часть.
+    Столбцы дат выбираются как текст (CAST), что бы sqlite3 не переводил их в dt.datetime построчно
+
+    :param table_name1: наименование таблицы в базе bd_oemz.bd3
+    :param cols_name1: список нужных столбцов
+    :param where1: условие запроса с ? или ''
+    :param params1: параметры запроса
+    :param chunksize1: кол-во строк в одной части
+    """
+    with conn_bd_oemz(read_only1=True) as conn:
         cur = conn.cursor()
+        types = declared_types(cur, table_name1)
+        select = [f'CAST({i} AS TEXT)' if types.get(i) in ('TIMESTAMP', 'DATE') else i for i in cols_name1]
+        cur.execute(f"""SELECT {','.join(select)} FROM {table_name1} {where1}""", params1)
+        first = True
+        while True:
+            rows = cur.fetchmany(chunksize1)
+            if not rows and not first:
+                break
+            yield typed_frame(rows, cols_name1, types)
+            first = False
+            if len(rows) < chunksize1:
+                break
 
-        if start_date is None and end_date is None and date_col is None:
-            cur.execute(f"""SELECT {','.join(cols_name1)} FROM {table_name1}""")
-        elif start_date is not None and end_date is not None and date_col is not None:
-            start_date = start_date.strftime("%Y-%m-%d %H:%M:%S")
-            end_date = end_date.strftime("%Y-%m-%d %H:%M:%S")
-            cur.execute(f"""SELECT {','.join(cols_name1)} FROM {table_name1}
-                            WHERE {date_col} BETWEEN '{start_date}' and '{end_date}'""")
-        else:
-            raise StartEndDateError
 
-        data = pd.DataFrame(data=cur.fetchall(), columns=cols_name1)
-        return data
+def typed_frame(rows1, cols_name1, types1) -> pd.DataFrame:
+    """
+    Собирает pd.DataFrame из строк запроса и приводит столбцы к типам по объявленным типам в базе
+
+    :param rows1: list строк из cursor.fetchmany
+    :param cols_name1: наименования столбцов
+    :param types1: dict {столбец: объявленный тип} из declared_types
+    """
+    table = pd.DataFrame(data=rows1, columns=cols_name1)
+    for i in cols_name1:
+        type_ = types1.get(i, '')
+        if type_ in ('TIMESTAMP', 'DATE'):
+            table[i] = pd.to_datetime(table[i], format='ISO8601')
+        elif type_ in ('REAL', 'FLOAT', 'DOUBLE'):
+            table[i] = pd.to_numeric(table[i]).astype('float64')
+        elif type_ == 'INTEGER':
+            table[i] = pd.to_numeric(table[i])  # int64, с пропусками float64
+    return table
 
 
 def check_data_in_db(name_data1: str) -> bool:
@@ -61,14 +181,41 @@ def check_data_in_db(name_data1: str) -> bool:
 
     :param name_data1: str наименование данных, которые надоп роверить
     """
-    with conn_bd_oemz() as conn:
+    return last_load(name_data1) is not None
+
+
+def last_load(name_data1: str):
+    """
+    Возвращает время последней сегодняшней загрузки данных и сумму добавленных (измененных) за сегодня строк.
+    Все сегодняшние загрузки читаются одним запросом и кэшируются на время запуска, база перечитывается только
+    если спрашивают данные, которых нет в кэше (их загрузка могла закончиться после заполнения кэша)
+
+    :param name_data1: str наименование данных like 'vp_164'
+    :return: (dt.datetime, int) или None, если сегодня загрузки не было
+    """
+    with LOADS_TODAY_LOCK:
+        today = dt.date.today()
+        if LOADS_TODAY.get('date') != today or name_data1 not in LOADS_TODAY['loads']:
+            LOADS_TODAY['date'] = today
+            LOADS_TODAY['loads'] = read_loads_today()
+        return LOADS_TODAY['loads'].get(name_data1)
+
+
+def read_loads_today() -> dict:
+    """
+    Читает из records_of_loads все сегодняшние загрузки одним запросом по индексу records_of_loads_date
+
+    :return: dict {наименование данных: (время последней загрузки, сумма строк)}
+    """
+    start_date = dt.datetime.combine(dt.date.today(), dt.time())
+    with conn_bd_oemz(read_only1=True) as conn:
         cur = conn.cursor()
-        cur_date = dt.datetime.now()
-        cur_date1 = cur_date + dt.timedelta(days=1)
-        cur.execute(f"""SELECT table_ FROM records_of_loads
-                WHERE date BETWEEN '{cur_date.strftime("%Y-%m-%d")} %' and '{cur_date1.strftime("%Y-%m-%d")} %'""")
-        availability = [i[0] for i in cur.fetchall()]
-        return name_data1 in availability
+        try:
+            cur.execute("""SELECT table_, MAX(date), SUM(rows_count) FROM records_of_loads
+                           WHERE date >= ? GROUP BY table_""", (start_date,))
+        except sql.OperationalError:  # таблицы еще нет - загрузок не было
+            return dict()
+        return {i[0]: (dt.datetime.fromisoformat(i[1]), i[2]) for i in cur.fetchall()}
 
 
 def return_name_cols(table1, cur1) -> tuple:
@@ -101,19 +248,338 @@ def symbols_for_query(name_table1, cur1):
     return cols_for_query, syms_for_query
 
 
-def insert_records_of_loads(cur1, name1) -> None:
+def bulk_insert(
+        cur1, name_table1, table1,
+        columns1=None, chunksize1=50000, rebuild_indexes1=False, upsert_key1=None
+) -> int:
+    """
+    Добавляет таблицу в базу bd_oemz.bd3 !без commit! (вставка идет в транзакции вызывающей загрузки, что бы
+    данные и запись в records_of_loads сохранялись вместе).
+    Столбцы переводятся в типы python один раз на весь столбец (datetime64 в dt.datetime, NaN/NaT/NA в None),
+    строки вставляются через executemany частями по chunksize1 строк.
+    Скорость вставки пишется в лог
+
+    :param cur1: объект sqlite3.connection.cursor
+    :param name_table1: наименование таблицы в базе like 'vp_164'
+    :param table1: pd.DataFrame с данными
+    :param columns1: столбцы таблицы в базе в порядке столбцов table1, None - все столбцы таблицы кроме id
+    :param chunksize1: кол-во строк в одном executemany
+    :param rebuild_indexes1: удалить индексы таблицы перед вставкой и создать после (для полной перезаливки)
+    :param upsert_key1: столбец с уникальным ключом, при совпадении ключа строка обновляется (ON CONFLICT)
+    :return: кол-во добавленных строк
+    """
+    start = time.perf_counter()
+    if columns1 is None:
+        columns1 = return_name_cols(name_table1, cur1)
+    query = f"""INSERT INTO {name_table1}({','.join(columns1)}) VALUES ({','.join(['?'] * len(columns1))})"""
+    if upsert_key1 is not None:
+        query += f""" ON CONFLICT({upsert_key1}) DO UPDATE SET {','.join(f'{i}=excluded.{i}' for i in columns1)}"""
+
+    indexes = drop_indexes(cur1, name_table1) if rebuild_indexes1 else []
+    values = [db_values(table1.iloc[:, i]) for i in range(table1.shape[1])]
+    for i in range(0, len(table1), chunksize1):
+        cur1.executemany(query, zip(*(col[i:i + chunksize1] for col in values)))
+    for i in indexes:
+        cur1.execute(i)
+
+    seconds = time.perf_counter() - start
+    log_message(f"bulk_insert {name_table1}: {len(table1)} rows, {len(table1) / max(seconds, 1e-6):.0f} rows/s")
+    return len(table1)
+
+
+def db_values(series1) -> np.ndarray:
+    """
+    Переводит pd.Series в numpy.array с объектами python, которые понимает sqlite3
+
+    :param series1: pd.Series
+    :return: numpy.array dtype=object, пропуски заменены на None
+    """
+    if pd.api.types.is_datetime64_any_dtype(series1):
+        values = np.array(series1.dt.to_pydatetime(), dtype=object)
+    else:
+        values = series1.to_numpy(dtype=object, copy=True)
+    values[series1.isna().values] = None
+    return values
+
+
+def sync_table(cur1, name_table1, table1, key1=None) -> int:
+    """
+    Приводит таблицу в базе bd_oemz.bd3 к содержимому table1, меняя только отличающиеся строки !без commit!
+    Строки сравниваются по хэшу значений, приведенных к типам столбцов таблицы в базе:
+        - с ключом key1: новые и измененные строки добавляются через INSERT ... ON CONFLICT(key1) DO UPDATE,
+        строки с ключами, которых нет в table1, удаляются
+        - без ключа: строки сравниваются как мультимножество, лишние удаляются по rowid, недостающие добавляются
+
+    :param cur1: объект sqlite3.connection.cursor
+    :param name_table1: наименование таблицы в базе like 'clients'
+    :param table1: pd.DataFrame, наименования столбцов как в таблице в базе
+    :param key1: столбец с уникальным ключом (PRIMARY KEY или UNIQUE) или None
+    :return: кол-во добавленных, измененных и удаленных строк
+    """
+    columns = list(table1.columns)
+    table1 = table1.reset_index(drop=True)
+    if key1 is not None:
+        table1 = table1.drop_duplicates(key1, keep='last').reset_index(drop=True)
+
+    types = declared_types(cur1, name_table1)
+    cur1.execute(f"""SELECT rowid, {','.join(columns)} FROM {name_table1}""")
+    inbase = pd.DataFrame(data=cur1.fetchall(), columns=['rowid_'] + columns)
+
+    new = pd.DataFrame({'hash_': hash_rows(table1, types), 'pos_': table1.index})
+    old = pd.DataFrame({'hash_': hash_rows(inbase[columns], types), 'rowid_': inbase['rowid_']})
+    if key1 is not None:
+        new['key_'] = normalize_types(table1[[key1]], types)[key1].values
+        old['key_'] = normalize_types(inbase[[key1]], types)[key1].values
+        diff = new.merge(old, on='key_', how='outer', suffixes=('', '_db'), indicator=True)
+        need_insert = diff[(diff['_merge'] == 'left_only') | (
+            (diff['_merge'] == 'both') & (diff['hash_'] != diff['hash__db'])
+        )]
+    else:
+        new['n_'] = new.groupby('hash_').cumcount()  # номер повтора одинаковых строк
+        old['n_'] = old.groupby('hash_').cumcount()
+        diff = new.merge(old, on=['hash_', 'n_'], how='outer', indicator=True)
+        need_insert = diff[diff['_merge'] == 'left_only']
+    need_delete = diff[diff['_merge'] == 'right_only']
+
+    cur1.executemany(
+        f"""DELETE FROM {name_table1} WHERE rowid = ?""",
+        ((int(i),) for i in need_delete['rowid_'].values)
+    )
+    bulk_insert(
+        cur1, name_table1, table1.loc[need_insert['pos_'].astype(int).values],
+        columns1=columns, upsert_key1=key1
+    )
+    return len(need_insert) + len(need_delete)
+
+
+def declared_types(cur1, name_table1) -> dict:
+    """
+    Возвращает объявленные типы столбцов таблицы {столбец: 'INTEGER'}
+
+    :param cur1: объект sqlite3.connection.cursor
+    :param name_table1: наименование таблицы в базе
+    """
+    cur1.execute(f"""pragma table_info({name_table1})""")
+    return {i[1]: i[2].upper() for i in cur1.fetchall()}
+
+
+def normalize_types(table1, types1) -> pd.DataFrame:
+    """
+    Приводит столбцы к виду, в котором sqlite хранит значения по объявленному типу столбца, что бы одинаковые
+    строки из файла и из базы давали одинаковый хэш: числа во float64, даты в datetime64, текст в str, пропуски
+    в None/NaN/NaT
+
+    :param table1: pd.DataFrame
+    :param types1: объявленные типы столбцов из declared_types
+    """
+    table = pd.DataFrame(index=table1.index)
+    for col in table1.columns:
+        col_type = types1.get(col, '')
+        if 'INT' in col_type or 'REAL' in col_type or 'FLOA' in col_type or 'DOUB' in col_type:
+            table[col] = pd.to_numeric(table1[col], errors='coerce').astype('float64')
+        elif 'TIMESTAMP' in col_type or 'DATE' in col_type:
+            table[col] = pd.to_datetime(table1[col]).astype('datetime64[ns]')  # хэш зависит от единиц datetime64
+        else:
+            table[col] = table1[col].map(lambda x: None if pd.isna(x) else str(x))
+    return table
+
+
+def hash_rows(table1, types1) -> np.ndarray:
+    """
+    Хэш каждой строки таблицы после normalize_types
+
+    :param table1: pd.DataFrame
+    :param types1: объявленные типы столбцов из declared_types
+    :return: numpy.array uint64
+    """
+    return pd.util.hash_pandas_object(normalize_types(table1, types1), index=False).values
+
+
+def drop_indexes(cur1, name_table1) -> list:
+    """
+    Удаляет созданные через CREATE INDEX индексы таблицы и возвращает запросы для их создания
+
+    :param cur1: объект sqlite3.connection.cursor
+    :param name_table1: наименование таблицы в базе like 'inputs'
+    :return: список запросов CREATE INDEX
+    """
+    cur1.execute(
+        """SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL""",
+        (name_table1,)
+    )
+    indexes = cur1.fetchall()
+    for name, _ in indexes:
+        cur1.execute(f"""DROP INDEX {name}""")
+    return [i[1] for i in indexes]
+
+
+def insert_records_of_loads(cur1, name1, rows1=None) -> None:
     """
     Добавляет запись о добавлении данных в нужную таблицу в базе bd_oemz.bd3 !без commit!
 
     :arg name1 - наименование таблицы, куда добавилась запись, string like 'inputs'
+    :arg cur1 - объект sqlite3.connection.cursor
+    :arg rows1 - кол-во добавленных или измененных строк, None - не считалось
+    """
+    create_records_of_loads(cur1)
+    row = (dt.datetime.now(), name1, rows1)
+    cur1.execute("""INSERT INTO records_of_loads(date,table_,rows_count) VALUES (?,?,?)""", row)
+
+
+def create_records_of_loads(cur1) -> None:
+    """
+    Создает таблицу records_of_loads с индексом по дате, если их не существует,
+    и добавляет столбец rows_count в таблицу, созданную до его появления
+
     :arg cur1 - объект sqlite3.connection.cursor
     """
     cur1.execute("""CREATE TABLE IF NOT EXISTS records_of_loads(
                     id INTEGER PRIMARY KEY,
                     date TIMESTAMP NOT NULL,
-                    table_ TEXT NOT NULL)""")
-    row = (dt.datetime.now(), name1)
-    cur1.execute("""INSERT INTO records_of_loads(date,table_) VALUES (?,?)""", row)
+                    table_ TEXT NOT NULL,
+                    rows_count INTEGER)""")
+    if 'rows_count' not in declared_types(cur1, 'records_of_loads'):  # таблица создана до появления rows_count
+        cur1.execute("""ALTER TABLE records_of_loads ADD COLUMN rows_count INTEGER""")
+    cur1.execute("""CREATE INDEX IF NOT EXISTS records_of_loads_date on records_of_loads(date, table_)""")
+
+
+def update_shift_stats(cur1, machine1, start1=None) -> None:
+    """
+    Пересчитывает в shift_stats смены станка machine1, начиная с производственной даты, в которую попадает start1,
+    одним запросом по индексу даты таблицы станка !без commit!
+    Если по станку в shift_stats еще ничего нет, то считаются все смены (первое заполнение таблицы).
+    Границы смен как в true_dates и def_smenas: сутки и 1 смена с 8-00, 2 смена с 20-00.
+    На станках из PLET_STARTS операции относятся к смене начала своей плети (как в детализации отчета),
+    операции до первого начала плети не считаются
+
+    :arg cur1 - объект sqlite3.connection.cursor
+    :arg machine1 - наименование станка из SHIFT_SOURCES like 'vp_164'
+    :arg start1 - dt.datetime самой ранней добавленной записи, None - новых записей нет
+    """
+    cur1.execute("""CREATE TABLE IF NOT EXISTS shift_stats(
+                    machine TEXT NOT NULL,
+                    date DATE NOT NULL,
+                    smena INTEGER NOT NULL,
+                    mass REAL,
+                    oper_seconds REAL,
+                    plets INTEGER,
+                    cards INTEGER,
+                    umc_mass REAL,
+                    by_plet INTEGER,
+                    PRIMARY KEY (machine, date, smena))""")
+    if 'by_plet' not in declared_types(cur1, 'shift_stats'):  # таблица создана до отнесения плетей к смене начала
+        cur1.execute("""ALTER TABLE shift_stats ADD COLUMN by_plet INTEGER""")
+    table, ts, mass, oper_seconds, plets, cards, umc_mass = SHIFT_SOURCES[machine1]
+    plet_start = PLET_STARTS.get(machine1)
+
+    if plet_start is not None:  # итоги, посчитанные по сменам операций, пересчитываются полностью
+        cur1.execute("""DELETE FROM shift_stats WHERE machine = ? AND by_plet IS NULL""", (machine1,))
+    cur1.execute("""SELECT 1 FROM shift_stats WHERE machine = ? LIMIT 1""", (machine1,))
+    if cur1.fetchone() is None:
+        start_date = dt.date(1900, 1, 1)
+    elif start1 is None:
+        return
+    else:
+        if plet_start is not None:  # новые операции могут продолжать плеть, начатую в прошлую загрузку
+            cur1.execute(f"""SELECT CAST(MAX({ts}) AS TEXT) FROM {table} WHERE {plet_start} AND {ts} <= ?""",
+                         (start1.strftime("%Y-%m-%d %H:%M:%S"),))
+            last_start = cur1.fetchone()[0]
+            if last_start is not None:
+                start1 = min(start1, dt.datetime.fromisoformat(last_start))
+        start_date = (start1 - dt.timedelta(hours=8)).date()  # производственная дата самой ранней записи
+
+    if plet_start is None:
+        shift_ts = ts
+    else:  # время начала плети, в которой идет операция
+        shift_ts = f"MAX(CASE WHEN {plet_start} THEN {ts} END) OVER (ORDER BY {ts}, id ROWS UNBOUNDED PRECEDING)"
+    cur1.execute("""DELETE FROM shift_stats WHERE machine = ? AND date >= ?""", (machine1, start_date.isoformat()))
+    cur1.execute(f"""INSERT INTO shift_stats(machine,date,smena,mass,oper_seconds,plets,cards,umc_mass,by_plet)
+                     SELECT ?, date(shift_ts, '-8 hours') AS date_,
+                            CASE WHEN time(shift_ts) >= '08:00:00' AND time(shift_ts) < '20:00:00'
+                                 THEN 1 ELSE 2 END AS smena_,
+                            SUM(mass_), SUM(oper_seconds_), SUM(plets_), SUM(cards_), SUM(umc_mass_), ?
+                     FROM (SELECT {shift_ts} AS shift_ts, {mass} AS mass_, {oper_seconds} AS oper_seconds_,
+                                  {plets} AS plets_, {cards} AS cards_, {umc_mass} AS umc_mass_
+                           FROM {table}
+                           WHERE {ts} >= ?)
+                     WHERE shift_ts IS NOT NULL
+                     GROUP BY date_, smena_""",
+                 (machine1, int(plet_start is not None), f'{start_date.isoformat()} 08:00:00'))
+
+
+def load_shift_stats(machine1, start_date1, end_date1) -> pd.DataFrame:
+    """
+    Загружает итоги по сменам станка из shift_stats
+
+    :param machine1: наименование станка из SHIFT_SOURCES like 'vp_164'
+    :param start_date1: dt.date первая производственная дата
+    :param end_date1: dt.date последняя производственная дата (включительно)
+    :return: pd.DataFrame с колонками date (dt.date), smena, mass, oper_seconds, plets, cards, umc_mass
+    """
+    cols = ['date', 'smena', 'mass', 'oper_seconds', 'plets', 'cards', 'umc_mass']
+    with conn_bd_oemz(read_only1=True) as conn:
+        cur = conn.cursor()
+        cur.execute(f"""SELECT {','.join(cols)} FROM shift_stats
+                        WHERE machine = ? AND date BETWEEN ? AND ?
+                        ORDER BY date, smena""", (machine1, start_date1.isoformat(), end_date1.isoformat()))
+        return pd.DataFrame(data=cur.fetchall(), columns=cols)
+
+
+def report_fingerprint(machine1, start1) -> tuple:
+    """
+    Считает отпечаток входных данных отчета по станку: окно данных с start1, максимальный id, кол-во строк и
+    максимальное время в окне. Если отпечаток не изменился, то и отчет не изменится
+
+    :param machine1: наименование станка из SHIFT_SOURCES like 'vp_164'
+    :param start1: dt.datetime начало окна данных отчета
+    :return: tuple (начало окна, max id, кол-во строк, max время) из строк и чисел
+    """
+    table, ts = SHIFT_SOURCES[machine1][:2]
+    start = start1.strftime("%Y-%m-%d %H:%M:%S")
+    with conn_bd_oemz(read_only1=True) as conn:
+        cur = conn.cursor()
+        cur.execute(f"""SELECT MAX(id), COUNT(*), CAST(MAX({ts}) AS TEXT) FROM {table}
+                        WHERE {ts} >= ?""", (start,))
+        return (start, *cur.fetchone())
+
+
+def read_report_fingerprint(report1):
+    """
+    Читает из report_fingerprints отпечаток входных данных, с которыми отчет был построен в последний раз
+
+    :param report1: наименование отчета
+    :return: tuple как в report_fingerprint или None, если отчет еще не строился
+    """
+    with conn_bd_oemz(read_only1=True) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""SELECT start_date, max_id, rows_count, max_date FROM report_fingerprints
+                           WHERE report = ?""", (report1,))
+        except sql.OperationalError:  # таблицы еще нет - отчеты не строились
+            return None
+        row = cur.fetchone()
+        return tuple(row) if row is not None else None
+
+
+def save_report_fingerprint(report1, fingerprint1) -> None:
+    """
+    Сохраняет в report_fingerprints отпечаток входных данных построенного отчета
+
+    :arg report1: наименование отчета
+    :arg fingerprint1: tuple из report_fingerprint
+    """
+    with conn_bd_oemz() as conn:
+        cur = conn.cursor()
+        cur.execute("""CREATE TABLE IF NOT EXISTS report_fingerprints(
+                        report TEXT PRIMARY KEY,
+                        start_date TEXT,
+                        max_id INTEGER,
+                        rows_count INTEGER,
+                        max_date TEXT,
+                        date TIMESTAMP NOT NULL)""")
+        cur.execute("""INSERT OR REPLACE INTO report_fingerprints(report,start_date,max_id,rows_count,max_date,date)
+                       VALUES (?,?,?,?,?,?)""", (report1, *fingerprint1, dt.datetime.now()))
+        conn.commit()
 
 
 def conn_pobeda() -> connect:
@@ -11,6 +11,26 @@ class XlFileError(Exception):
         print('File excel not found in path!')
 
 
+class XlMacroError(Exception):
+    def __init__(self, path1):
+        super().__init__(f'Ошибка в работе макроса в файле {path1}')
+
+
+class PlazmaCardError(Exception):
+    def __init__(self, path1):
+        super().__init__(f'Файл не является картой по плазме: {path1}')
+
+
+class VpLoadError(Exception):
+    def __init__(self, names1):
+        super().__init__(f'Не загрузились данные по линиям: {", ".join(names1)}')
+
+
 class MethodAccountingFileError(Exception):
     def __init__(self):
         print('Attribute "method" receives only 2 values: create and change!')
+
+
+class StageDependencyError(Exception):
+    def __init__(self):
+        print('Stages have unknown or cyclic dependencies!')
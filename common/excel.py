@@ -1,23 +1,116 @@
 """Excel functions"""
 
 import os
-import xlwings as xw
-import win32com.client
+import openpyxl
 
-from common.error import XlFileError
+from common.common import log_message
+from common.error import XlFileError, XlMacroError
 
+try:  # Excel есть только на Windows, без него отчеты пишутся через openpyxl
+    import pythoncom
+    import xlwings as xw
+    import win32com.client
+except ImportError:
+    xw = None
 
-class ContManagExcel(xw.App):
-    """xw.App с поведением контекстного менеджера"""
-    def __init__(self, *args, **kwargs):
-        super().__init__(args, kwargs)
+XL_BACKEND = 'openpyxl' if xw is None else 'xlwings'  # чем записывать листы по умолчанию
 
-    def __enter__(self):
-        return self
 
-    def __exit__(self, exc_type, exc_value, traceback):
-        # print(traceback)
-        self.kill()
+if xw is not None:
+    class ContManagExcel(xw.App):
+        """xw.App с поведением контекстного менеджера"""
+        def __init__(self, *args, **kwargs):
+            super().__init__(args, kwargs)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            # print(traceback)
+            self.kill()
+
+
+def write_xlsheets(tables1: dict, path1, macro1=None, backend1=None) -> None:
+    """
+    Загружает таблицы на листы файла эксель за одно открытие и сохранение файла,
+    листы с такими же наименованиями пересоздаются
+
+    :param tables1: dict {наименование листа: pd.DataFrame}, таблицы пишутся без индекса и заголовков
+    :param path1: путь к файлу ексель с макросом
+    :param macro1: наименование макроса в Module1, который выполняется после записи листов, None - без макроса
+    :param backend1: 'xlwings' - через Excel в одном запуске приложения,
+    'openpyxl' - без Excel в копию файла рядом с ним (макрос не выполняется), None - XL_BACKEND
+    :raise: XlFileError если файла не существует, то ошибка
+    """
+    if not os.path.exists(path1):
+        raise XlFileError
+    path1 = os.path.abspath(path1)
+    backend1 = backend1 or XL_BACKEND
+    if backend1 == 'xlwings':
+        write_xlsheets_xlwings(tables1, path1, macro1)
+    elif backend1 == 'openpyxl':
+        out_path = write_xlsheets_openpyxl(tables1, path1)
+        if macro1 is not None:
+            log_message(f"macro {macro1} in {out_path} was skipped: openpyxl can't run macros")
+    else:
+        raise ValueError(f'Unknown excel backend {backend1}')
+
+
+def write_xlsheets_xlwings(tables1: dict, path1, macro1=None) -> None:
+    """
+    Записывает листы и выполняет макрос в одном запуске Excel
+
+    :param tables1: dict {наименование листа: pd.DataFrame}
+    :param path1: абсолютный путь к файлу ексель с макросом
+    :param macro1: наименование макроса в Module1, None - без макроса
+    """
+    pythoncom.CoInitialize()  # COM инициализируется в потоке записи, run_reports пишет отчеты в вызывающем потоке
+    with ContManagExcel(visible=False):
+        wb = xw.Book(path1)
+        for sh_name, table in tables1.items():
+            try:
+                wb.sheets[sh_name].delete()
+            except:
+                pass
+
+            ws = wb.sheets.add(name=sh_name)
+            ws.range('A1').options(index=False, header=False).value = table
+
+        if macro1 is not None:
+            try:
+                wb.macro('Module1.' + macro1)()
+            except:
+                raise XlMacroError(path1)
+        wb.save()
+        wb.close()
+
+
+def write_xlsheets_openpyxl(tables1: dict, path1) -> str:
+    """
+    Записывает листы без Excel в копию файла "<имя>_openpyxl<расширение>" рядом с ним, макросы файла .xlsm
+    сохраняются (keep_vba). Сам файл не перезаписывается: openpyxl теряет стили и цвета диаграмм,
+    поэтому сохранение на место испортило бы шаблон отчета, а копия каждый раз делается из целого шаблона
+
+    :param tables1: dict {наименование листа: pd.DataFrame}
+    :param path1: абсолютный путь к файлу ексель
+    :return: путь к записанной копии
+    """
+    root, ext = os.path.splitext(path1)
+    out_path = f'{root}_openpyxl{ext}'
+    wb = openpyxl.load_workbook(path1, keep_vba=path1.lower().endswith('.xlsm'))
+    try:
+        for sh_name, table in tables1.items():
+            if sh_name in wb.sheetnames:
+                del wb[sh_name]
+
+            ws = wb.create_sheet(title=sh_name)
+            values = table.astype(object).where(table.notna(), None)  # NaN/NaT в пустые ячейки
+            for row in values.itertuples(index=False, name=None):
+                ws.append(row)
+        wb.save(out_path)
+    finally:
+        wb.close()
+    return out_path
 
 
 def load_table_in_xlsheet(table1, sh_name1, path1):
@@ -29,18 +122,7 @@ def load_table_in_xlsheet(table1, sh_name1, path1):
     :param path1: путь к файлу ексель с макросом
     :return: execute добавляет данные на лист
     """
-    path1 = os.path.abspath(path1)
-    with ContManagExcel(visible=False) as app:
-        wb = xw.Book(path1)
-        try:
-            wb.sheets[sh_name1].delete()
-        except:
-            pass
-
-        ws = wb.sheets.add(name=sh_name1)
-        ws.range('A1').options(index=False, header=False).value = table1
-        wb.save()
-        wb.close()
+    write_xlsheets({sh_name1: table1}, path1)
 
 
 def run_macro(path1, name_macros):
@@ -55,6 +137,7 @@ def run_macro(path1, name_macros):
     if os.path.exists(path1):
         path1 = os.path.abspath(path1)
         excel_path = os.path.expanduser(path1)
+        pythoncom.CoInitialize()  # COM инициализируется в потоке записи, run_reports пишет отчеты в вызывающем потоке
         try:
             excel_macro = win32com.client.DispatchEx("Excel.Application")
             workbook = excel_macro.Workbooks.Open(Filename=excel_path, ReadOnly=1)
@@ -66,7 +149,7 @@ def run_macro(path1, name_macros):
         except:
             excel_macro.Application.Quit()
             del excel_macro
-            raise BaseException(f'Ошибка в работе макроса в файле {excel_path}')
+            raise XlMacroError(excel_path)
     else:
         raise XlFileError
 
@@ -0,0 +1,226 @@
+"""Stage scheduler"""
+
+import time
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from common.common import log_message
+from common.database import read_report_fingerprint, save_report_fingerprint
+from common.error import StageDependencyError
+
+
+class Stage:
+    """
+    Этап выполнения для run_stages: функция с аргументами, зависимостями и условием запуска
+
+    :arg name - уникальное наименование этапа, на него ссылаются зависимости других этапов
+    :arg func - исполняемая функция
+    :arg args - аргументы функции, формата (x,) или (x1,x2)
+    :arg deps - наименования этапов, после успешного выполнения которых запускается этап
+    :arg lock - наименование ресурса, этапы с одинаковым lock не выполняются одновременно (например 'excel')
+    :arg condition - функция без аргументов, если возвращает False, то этап пропускается
+    """
+    def __init__(self, name, func, args=(), deps=(), lock=None, condition=None):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.deps = tuple(deps)
+        self.lock = lock
+        self.condition = condition
+
+
+class Report:
+    """
+    Отчет для run_reports: подготовка данных и запись их в эксель
+
+    :arg name - уникальное наименование отчета
+    :arg write - функция записи в эксель, вызывается как write(*args, результат prep) или write(*args), если prep нет
+    :arg prep - функция подготовки данных уровня модуля (выполняется в отдельном процессе), None - только запись
+    :arg args - аргументы функций, формата (x,) или (x1,x2)
+    :arg deps - наименования этапов run_stages, после успешного выполнения которых строится отчет
+    :arg condition - функция без аргументов, если возвращает False, то отчет пропускается
+    :arg fingerprint - функция отпечатка входных данных, вызывается как fingerprint(*args), если отпечаток
+    совпадает с сохраненным при прошлом построении, то отчет пропускается
+    """
+    def __init__(self, name, write, prep=None, args=(), deps=(), condition=None, fingerprint=None):
+        self.name = name
+        self.write = write
+        self.prep = prep
+        self.args = args
+        self.deps = tuple(deps)
+        self.condition = condition
+        self.fingerprint = fingerprint
+
+
+def run_stages(stages1, max_workers1=4) -> dict:
+    """
+    Выполняет этапы с учетом зависимостей: независимые этапы выполняются одновременно в пуле из max_workers1
+    потоков. Если этап упал или пропущен, то зависящие от него этапы пропускаются.
+    По каждому этапу в "..\\LOG_LOAD_DB.log" пишется статус, время выполнения и traceback при падении
+
+    :arg stages1 - список объектов Stage
+    :arg max_workers1 - кол-во одновременно выполняемых этапов
+    :raise StageDependencyError если зависимости ссылаются на неизвестные этапы или зациклены
+    :return dict {наименование этапа: статус 'done', 'down' или 'skipped'}
+    """
+    names = {i.name for i in stages1}
+    if len(names) != len(stages1) or any(d not in names for i in stages1 for d in i.deps):
+        raise StageDependencyError
+
+    statuses = dict()
+    pending = list(stages1)
+    running = dict()  # future: stage
+    with ThreadPoolExecutor(max_workers=max_workers1) as pool:
+        while pending or running:
+            busy_locks = {i.lock for i in running.values() if i.lock is not None}
+            changed = True
+            while changed:  # пропуск этапа может сделать готовыми к пропуску этапы выше по списку
+                changed = False
+                for stage in list(pending):
+                    if any(d in statuses and statuses[d] != 'done' for d in stage.deps):
+                        pending.remove(stage)
+                        statuses[stage.name] = 'skipped'
+                        log_message(f"{stage.name} skipped, dependencies were not done")
+                        changed = True
+                    elif all(d in statuses for d in stage.deps) and stage.lock not in busy_locks:
+                        pending.remove(stage)
+                        running[pool.submit(execute_stage, stage)] = stage
+                        if stage.lock is not None:
+                            busy_locks.add(stage.lock)
+
+            if not running:
+                if pending:
+                    raise StageDependencyError  # этапы ждут друг друга
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                statuses[stage.name] = future.result()
+    return statuses
+
+
+def execute_stage(stage1) -> str:
+    """
+    Выполняет этап и пишет в лог статус, время выполнения и traceback при падении
+
+    :arg stage1 - объект Stage
+    :return статус 'done', 'down' или 'skipped'
+    """
+    start = time.perf_counter()
+    try:
+        if stage1.condition is not None and not stage1.condition():
+            log_message(f"{stage1.name} skipped by condition")
+            return 'skipped'
+        stage1.func(*stage1.args)
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except BaseException:  # падение одного этапа не должно останавливать остальные этапы
+        log_message(
+            f"{stage1.name} was down in {time.perf_counter() - start:.1f} s\n{traceback.format_exc()}"
+        )
+        return 'down'
+    log_message(f"{stage1.name} done in {time.perf_counter() - start:.1f} s")
+    return 'done'
+
+
+def run_reports(reports1, statuses1=None, max_workers1=None, force1=False) -> dict:
+    """
+    Строит отчеты: подготовка данных (выборка из базы и pandas) всех отчетов выполняется одновременно в пуле из
+    max_workers1 процессов, а запись в эксель идет по одному отчету в текущем процессе по мере готовности данных.
+    Отчет с fingerprint строится, только если входные данные изменились с прошлого построения.
+    По каждому отчету в "..\\LOG_LOAD_DB.log" пишется статус, время подготовки и записи и traceback при падении
+
+    :arg reports1 - список объектов Report
+    :arg statuses1 - dict статусов этапов из run_stages, отчет пропускается, если его зависимости не 'done'
+    :arg max_workers1 - кол-во процессов, None - по кол-ву ядер
+    :arg force1 - True - строить отчеты, даже если отпечаток входных данных не изменился
+    :return dict {наименование отчета: статус 'done', 'down' или 'skipped'}
+    """
+    statuses1 = statuses1 or dict()
+    statuses = dict()
+    fingerprints = dict()
+    ready = list()
+    for report in reports1:
+        try:
+            if any(statuses1.get(d) != 'done' for d in report.deps):
+                log_message(f"{report.name} skipped, dependencies were not done")
+                statuses[report.name] = 'skipped'
+            elif report.condition is not None and not report.condition():
+                log_message(f"{report.name} skipped by condition")
+                statuses[report.name] = 'skipped'
+            else:
+                if report.fingerprint is not None:
+                    fingerprints[report.name] = report.fingerprint(*report.args)
+                    if not force1 and fingerprints[report.name] == read_report_fingerprint(report.name):
+                        log_message(f"{report.name} skipped, input data not changed")
+                        statuses[report.name] = 'skipped'
+                        continue
+                ready.append(report)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except BaseException:
+            log_message(f"{report.name} was down\n{traceback.format_exc()}")
+            statuses[report.name] = 'down'
+
+    with ProcessPoolExecutor(max_workers=max_workers1) as pool:
+        futures = {pool.submit(prepare_report, i.prep, i.args): i for i in ready if i.prep is not None}
+        for report in ready:  # отчеты без подготовки данных пишутся, пока готовятся данные остальных
+            if report.prep is None:
+                statuses[report.name] = write_report(report, fingerprint1=fingerprints.get(report.name))
+        for future in as_completed(futures):  # отчеты пишутся в эксель по мере готовности данных
+            report = futures[future]
+            try:
+                data, seconds = future.result()
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except BaseException:
+                log_message(f"{report.name} preparation was down\n{traceback.format_exc()}")
+                statuses[report.name] = 'down'
+                continue
+            log_message(f"{report.name} prepared in {seconds:.1f} s")
+            statuses[report.name] = write_report(report, (data,), fingerprints.get(report.name))
+    return statuses
+
+
+def prepare_report(prep1, args1) -> tuple:
+    """
+    Выполняет подготовку данных отчета. Функция уровня модуля, чтобы ее можно было выполнять в ProcessPoolExecutor
+
+    :arg prep1 - функция подготовки данных уровня модуля
+    :arg args1 - аргументы функции
+    :return результат prep1 и время выполнения в секундах
+    """
+    start = time.perf_counter()
+    data = prep1(*args1)
+    return data, time.perf_counter() - start
+
+
+def write_report(report1, data1=(), fingerprint1=None) -> str:
+    """
+    Записывает отчет в эксель и пишет в лог статус, время записи и traceback при падении.
+    Отпечаток входных данных сохраняется сразу после записи, только для построенного отчета
+
+    :arg report1 - объект Report
+    :arg data1 - результат подготовки данных формата (x,) или () если подготовки нет
+    :arg fingerprint1 - отпечаток входных данных отчета, None - не считался
+    :return статус 'done' или 'down'
+    """
+    start = time.perf_counter()
+    try:
+        report1.write(*report1.args, *data1)
+    except (KeyboardInterrupt, SystemExit):
+        raise
+    except BaseException:  # падение одного отчета не должно останавливать запись остальных
+        log_message(
+            f"{report1.name} writing was down in {time.perf_counter() - start:.1f} s\n{traceback.format_exc()}"
+        )
+        return 'down'
+    log_message(f"{report1.name} written in {time.perf_counter() - start:.1f} s")
+
+    if fingerprint1 is not None:
+        try:
+            save_report_fingerprint(report1.name, fingerprint1)
+        except Exception:  # отчет уже построен, в следующий раз он просто построится заново
+            log_message(f"{report1.name} fingerprint was not saved\n{traceback.format_exc()}")
+    return 'done'
@@ -1,16 +1,21 @@
 """loading clients in DB"""
 
-import pandas as pd
-
-from common.database import (conn_bd_oemz, insert_records_of_loads)
+from common.cache import read_excel_cached
+from common.database import (
+    conn_bd_oemz, insert_records_of_loads, bulk_insert, sync_table
+)
 from etl.inputs import pick_last_inputs
 
 
-def load_clients():
-    """Загружает в базу данных bd_oemz.bd3 список клиентов и их ИНН из таблицы поступлений"""
+def load_clients(full_reload1=False):
+    """
+    Загружает в базу данных bd_oemz.bd3 список клиентов и их ИНН из таблицы поступлений
+
+    :arg full_reload1 - True: удалить все строки и загрузить заново, False: изменить только отличающиеся строки
+    """
     path_last_file = pick_last_inputs()
-    table = pd.read_excel(path_last_file, usecols=['ИНН_Контрагента', 'Контрагент'])
-    table = table.rename(columns={'ИНН_Контрагента': 'inn', 'Контрагент': 'client'})
+    table = read_excel_cached(path_last_file)[['Контрагент', 'ИНН_Контрагента']]  # файл разбирается один раз на загрузки inputs и clients
+    table = table.rename(columns={'ИНН_Контрагента': 'inn', 'Контрагент': 'name'})
     table = table.drop_duplicates('inn').dropna()
     table.inn = table.inn.map(int)
 
@@ -19,8 +24,11 @@ def load_clients():
         cur.execute(""" CREATE TABLE IF NOT EXISTS clients(
                         inn INTEGER PRIMARY KEY,
                         name TEXT NOT NULL)""")
-        cur.execute("""DELETE FROM  clients""")
         cur.execute(""" CREATE INDEX IF NOT EXISTS clients_inn on clients(inn)""")
-        cur.executemany("""INSERT INTO clients (name,inn) VALUES (?,?)""", table.values)
-        insert_records_of_loads(cur, 'clients')
+        if full_reload1:
+            cur.execute("""DELETE FROM  clients""")
+            rows = bulk_insert(cur, 'clients', table, columns1=table.columns, rebuild_indexes1=True)
+        else:
+            rows = sync_table(cur, 'clients', table, key1='inn')
+        insert_records_of_loads(cur, 'clients', rows)
         conn.commit()
@@ -1,36 +1,37 @@
 """loading inputs in DB"""
 
-import datetime as dt
 import glob
 import pandas as pd
 import os
 
-from common.database import conn_bd_oemz
-from common.common import (parse_date_point, to_datetime_in_list)
+from common.cache import read_excel_cached
+from common.database import (
+    conn_bd_oemz, insert_records_of_loads, bulk_insert, sync_table
+)
+from common.common import parse_date_point
 
 
-def load_inputs():
+def load_inputs(full_reload1=False):
     """
     Загружаем в базу данных bd_oemz.bd3 список.
     Обязательно помним, что pandas.Timestamp не помещается в sqlite3, нужно переводить в другой формат
+
+    :arg full_reload1 - True: удалить все строки и загрузить заново, False: изменить только отличающиеся строки
     """
     path_last_file = pick_last_inputs()
-    table = pd.read_excel(
-        path_last_file,
-        usecols=[
-            'Номер4', 'Дата', 'НомерВходящегоДокумента', 'Склад',
-            'Количество', 'Цена', 'Код_УПП', 'ИНН_Контрагента'
-        ],
-        parse_dates=['Дата'], dayfirst=True)
+    table = read_excel_cached(path_last_file)[[
+        'Номер4', 'Дата', 'НомерВходящегоДокумента', 'Склад',
+        'Количество', 'Цена', 'Код_УПП', 'ИНН_Контрагента'
+    ]]  # файл разбирается один раз на загрузки inputs и clients
     table = table.rename(columns={
         'Номер4': 'input_id', 'Дата': 'date', 'НомерВходящегоДокумента': 'inputdoc_id',
         'Склад': 'stock', 'Количество': 'amount', 'Цена': 'price_without_vat',
         'Код_УПП': 'nom_code', 'ИНН_Контрагента': 'client_inn'
     })
+    table.date = pd.to_datetime(table.date, dayfirst=True)
     table = table.dropna(subset=['client_inn', 'nom_code'])
     table.client_inn = table.client_inn.map(int)
     table.price_without_vat = table.price_without_vat.replace({None: 0})
-    table = to_datetime_in_list(table.values, 1)
 
     with conn_bd_oemz() as conn:
         cur = conn.cursor()
@@ -48,11 +49,12 @@ def load_inputs():
                         FOREIGN KEY(client_inn) REFERENCES clients(inn))""")
         cur.execute(""" CREATE INDEX IF NOT EXISTS inputs_nom_code on inputs (nom_code)""")
         cur.execute(""" CREATE INDEX IF NOT EXISTS inputs_date on inputs (date)""")
-        cur.execute("""DELETE FROM  inputs""")
-        cur.executemany(""" INSERT INTO inputs(input_id,date,inputdoc_id,stock,amount,
-                            price_without_vat,nom_code,client_inn)
-                            VALUES (?,?,?,?,?,?,?,?)""", table)
-        insert_records_of_loads(cur, 'inputs')
+        if full_reload1:
+            cur.execute("""DELETE FROM  inputs""")
+            rows = bulk_insert(cur, 'inputs', table, columns1=table.columns, rebuild_indexes1=True)
+        else:
+            rows = sync_table(cur, 'inputs', table)  # у поступлений нет ключа, строки сравниваются целиком
+        insert_records_of_loads(cur, 'inputs', rows)
         conn.commit()
 
 
@@ -70,18 +72,3 @@ def pick_last_inputs():
         table_path_date['date'] == table_path_date['date'].max()
     ].values[0]
 
-
-def insert_records_of_loads(cur1, name1):
-    """
-    Добавляет запись о добавлении данных в нужную таблицу в базе bd_oemz.bd3 !без commit!
-
-    :arg
-        name1 - наименование таблицы, куда добавилась запись, string like 'inputs'
-        cur1 - объект sqlite3.connection.cursor
-    """
-    cur1.execute("""CREATE TABLE IF NOT EXISTS records_of_loads(
-                    id INTEGER PRIMARY KEY,
-                    date TIMESTAMP NOT NULL,
-                    table_ TEXT NOT NULL)""")
-    row = (dt.datetime.now(), name1)
-    cur1.execute("""INSERT INTO records_of_loads(date,table_) VALUES (?,?)""", row)
@@ -2,13 +2,21 @@
 
 import pandas as pd
 
-from common.database import (conn_bd_oemz, insert_records_of_loads)
+from common.database import (
+    conn_bd_oemz, insert_records_of_loads, bulk_insert, sync_table
+)
 
 
-def load_nomenclature():
+def load_nomenclature(full_reload1=False):
     """
     Загружает в базу данных bd_oemz.bd3 справочник номенклатур
+
+    :arg full_reload1 - True: удалить все строки и загрузить заново, False: изменить только отличающиеся строки
     """
+    data_dict = pd.read_excel(
+        r"\\oemz-fs01.oemz.ru\Works$\Analytics\Выгрузки из УПП\Справочник\list_nom.XLS"
+    )  # читается до DELETE, что бы не держать базу заблокированной на время чтения файла
+    data_dict.columns = ['code', 'name', 'unite', 'indicator']
     with conn_bd_oemz() as conn:
         cur = conn.cursor()
         cur.execute(""" CREATE TABLE if not EXISTS nomenclature(
@@ -18,13 +26,10 @@ def load_nomenclature():
                         indicator TEXT)""")
         cur.execute(""" CREATE INDEX IF NOT EXISTS nomenclature_code
                         on nomenclature(code)""")
-        cur.execute("""DELETE FROM nomenclature""")
-        data_dict = pd.read_excel(
-            r"\\oemz-fs01.oemz.ru\Works$\Analytics\Выгрузки из УПП\Справочник\list_nom.XLS"
-        ).values
-        cur.executemany(
-            """INSERT INTO nomenclature (code,name,unite,indicator) VALUES (?,?,?,?)""",
-            data_dict
-        )
-        insert_records_of_loads(cur, 'nomenclature')
+        if full_reload1:
+            cur.execute("""DELETE FROM nomenclature""")
+            rows = bulk_insert(cur, 'nomenclature', data_dict, columns1=data_dict.columns, rebuild_indexes1=True)
+        else:
+            rows = sync_table(cur, 'nomenclature', data_dict, key1='code')
+        insert_records_of_loads(cur, 'nomenclature', rows)
         conn.commit()
@@ -3,30 +3,56 @@
 import datetime as dt
 import pandas as pd
 import os
+import re
+import hashlib
 import xlrd
-
-from typing import Union
-from common.common import to_datetime_in_list
-from common.database import (conn_bd_oemz, symbols_for_query)
-from common.error import MethodAccountingFileError
-
-
-def load_plazma_tables(path1: str) -> None:
+import openpyxl
+
+from concurrent.futures import ProcessPoolExecutor
+from common.common import (log_message, plazma_path_numbers)
+from common.error import PlazmaCardError
+from common.database import (
+    conn_bd_oemz, bulk_insert, insert_records_of_loads, declared_types, update_shift_stats, check_data_in_db
+)
+
+COORDINATES = ((3, 2), (6, 2), (6, 7),
+               (14, 3), (16, 3),
+               (14, 5), (15, 5), (16, 5),
+               (14, 7), (15, 7),
+               (14, 11), (15, 11), (16, 11), (18, 11),
+               (14, 13), (15, 13), (16, 13))  # координаты нужных ячеек карты в формате (row, col)
+SIZE_PATTERN = (
+    r'(?P<size_length>\d+)\s*mm\s*[xXхХ]?\s*'
+    r'(?P<size_width>\d+)\s*mm\s*[xXхХ]?\s*'
+    r'(?P<size_thickness>\d+)\s*mm'
+)  # размер листа в карте like '6010mmx1500mmx4mm'
+NOT_CARD_PATTERN = re.compile(r'Отч[её]т\s+ССЗ\s+Voortman', re.IGNORECASE)  # сводные книги за месяц в папке карт
+MIN_FILES_FOR_POOL = 200  # при меньшем кол-ве карт запуск процессов дороже самого чтения
+
+
+def load_plazma_tables(path1: str, full_scan1=None) -> None:
     """
     Создание таблицы и индекса, если их не сущещствовало прописано в need_plazma_files.
+    Состояние просмотренных папок сохраняется в plazma_dirs в той же транзакции, что и карты.
+    Первая за день загрузка просматривает все папки, чтобы найти карты, перезаписанные на месте
 
     :arg path1 - путь к папке с файлами по плазме (для сравнения с файлами из базы)
+    :arg full_scan1 - True - просмотреть все папки, не используя сохраненное состояние plazma_dirs,
+    False - только измененные папки, None - все папки, если сегодня карты еще не загружались
     """
+    if full_scan1 is None:
+        full_scan1 = not check_data_in_db('plazma')
     with conn_bd_oemz() as conn:
         cur = conn.cursor()
-        npf = need_plazma_files(path1)  # npf - need_plazma_files
-        data = collect_plazma_data(npf.path.values, npf)  # данные для загрузки в таблицу plazma_cards
+        npf, dirs, unreadable = need_plazma_files(cur, path1, full_scan1)  # npf - need_plazma_files
+        cards = npf[~npf.duplicate]  # копии уже загруженных карт не читаем
+        data, errors = collect_plazma_data(cards.path.values, cards)  # данные для загрузки в таблицу plazma_cards
 
-        npf = to_datetime_in_list(npf.values, 2)  # преобразование в numpy.array и dt_change в dt.datetime
-        cur.executemany(
-            """INSERT INTO plazma_files(path,base_name,dt_change) VALUES(?,?,?)""",
-            npf
-        )  # поместили список файлов в базу
+        quarantine_plazma_files(cur, npf, unreadable + errors)
+        npf = npf[~npf.path.isin([i[0] for i in errors])]  # непрочитанные карты не считаем загруженными
+        files_cols = ['path', 'base_name', 'dt_change', 'size', 'hash']
+        bulk_insert(cur, 'plazma_files', npf[files_cols], columns1=files_cols)  # поместили список файлов в базу
+        update_plazma_dirs(cur, dirs)
 
         cur.execute("""CREATE TABLE IF NOT EXISTS plazma_cards(
         id INTEGER PRIMARY KEY,
@@ -50,109 +76,287 @@ def load_plazma_tables(path1: str) -> None:
         stub_weight REAL,
         size_length INTEGER,
         size_width INTEGER,
-        size_thickness INTEGER)""")
+        size_thickness INTEGER,
+        n_task INTEGER,
+        n_card INTEGER,
+        operator INTEGER)""")
+        if 'n_task' not in declared_types(cur, 'plazma_cards'):  # таблица создана до появления номеров из путей
+            for i in ('n_task', 'n_card', 'operator'):
+                cur.execute(f"""ALTER TABLE plazma_cards ADD COLUMN {i} INTEGER""")
         cur.execute("""CREATE INDEX IF NOT EXISTS plazma_cards_dt on plazma_cards(dt_change)""")
 
-        columns_for_query_1, symbols_for_query_1 = symbols_for_query('plazma_cards', cur)  # списки колонок и вопросиков для запроса
-        query_1 = f"""INSERT INTO plazma_cards({columns_for_query_1}) VALUES ({symbols_for_query_1})"""
-        cur.executemany(query_1, to_datetime_in_list(data.values, 1))
-        insert_records_of_loads(cur, 'plazma')
+        numbers = plazma_path_numbers(data['path_in'], data['path'])  # номера задания, карты и оператора
+        data = pd.concat([data, numbers], axis=1)
+
+        rows = bulk_insert(cur, 'plazma_cards', data)  # столбцы по порядку как в таблице plazma_cards
+        update_shift_stats(cur, 'plazma', data['dt_change'].min() if rows else None)  # итоги затронутых смен
+        insert_records_of_loads(cur, 'plazma', rows)
         conn.commit()
 
 
-def need_plazma_files(path1) -> pd.DataFrame:
+def need_plazma_files(cur1, path1, full_scan1=False) -> tuple:
     """
-    Сначала пытаемся создать таблицу, потом пытаемся получить список файлов, загруженных в базу bd_oemz.bd3
+    Сначала пытаемся создать таблицы, потом просматриваем измененные папки и сравниваем найденные файлы
+    с загруженными в базу bd_oemz.bd3 запросом по индексу plazma_files_name.
+    Карты из plazma_quarantine проверяются при каждой загрузке (даже в непросмотренных папках)
+    и пропускаются, пока у файла не изменится отпечаток. Хэш таких карт пересчитывается, только если
+    у файла изменились размер или mtime_ns. Файлы, которые не удалось открыть для отпечатка,
+    в таблицу не попадают и возвращаются отдельно с ошибкой, чтобы уйти в plazma_quarantine.
+    Делает commit, чтобы не держать блокировку базы пока читаются карты
 
+    :arg cur1 - объект sqlite3.connection.cursor
     :arg path1 - путь к папке с файлами по плазме (для сравнения с файлами из базы)
-    :return pd.DataFrame с данными о файлах, которые нужно загрузить с колонками 'path', 'base_name', 'dt_change'
-    """
-    exceptions_ = [
-        r'W:\Plasma\REPORT\2019\ФЕВРАЛЬ 2019\ссз № 84040 карта № 7134                 10мм               12.02.2019.xls',
-        r"W:\Plasma\REPORT\2020\Март 2020\8\по распоряжению зам нач цеха                           6мм                        07.03.2020.xls",
-        r"W:\Plasma\REPORT\2020\Отчёт ССЗ Voortman V304 АПРЕЛЬ  2020.xlsx",
-        r"W:\Plasma\REPORT\2020\Отчёт ССЗ Voortman V304 М А Й  2020.xlsx",
-        r"W:\Plasma\REPORT\2020\Отчёт ССЗ Voortman V304 И Ю Н Ь 2020.xlsx",
-        r"W:\Plasma\REPORT\2020\Отчёт ССЗ Voortman V304 ИЮЛЬ 2020.xlsx"
-    ]  # файлы, которые не открываются или в неправильном или нечитаемом формате
-    with conn_bd_oemz() as conn:
-        cur = conn.cursor()
-        cur.execute("""CREATE TABLE IF NOT EXISTS plazma_files(
-        id INTEGER PRIMARY KEY,
-        path TEXT,
-        base_name text,
-        dt_change TIMESTAMP)""")
-        cur.execute("""CREATE INDEX IF NOT EXISTS plazma_files_dt on plazma_files(dt_change)""")
-        conn.commit()
+    :arg full_scan1 - True - просмотреть все папки, не используя сохраненное состояние plazma_dirs
+    :return (
+    pd.DataFrame с данными о файлах, которые нужно загрузить с колонками
+    'path', 'base_name', 'dt_change', 'size', 'mtime_ns', 'hash',
+    'duplicate' (True - карта с таким содержимым уже есть),
+    list с новым состоянием измененных папок для update_plazma_dirs,
+    list с (путь к файлу, текст ошибки) по файлам, которые не удалось прочитать
+    )
+    """
+    cur1.execute("""CREATE TABLE IF NOT EXISTS plazma_files(
+    id INTEGER PRIMARY KEY,
+    path TEXT,
+    base_name text,
+    dt_change TIMESTAMP,
+    size INTEGER,
+    hash TEXT)""")
+    if 'hash' not in declared_types(cur1, 'plazma_files'):  # таблица создана до появления отпечатков файлов
+        cur1.execute("""ALTER TABLE plazma_files ADD COLUMN size INTEGER""")
+        cur1.execute("""ALTER TABLE plazma_files ADD COLUMN hash TEXT""")
+        fill_plazma_fingerprints(cur1)
+    cur1.execute("""CREATE INDEX IF NOT EXISTS plazma_files_dt on plazma_files(dt_change)""")
+    cur1.execute("""CREATE INDEX IF NOT EXISTS plazma_files_name on plazma_files(base_name, dt_change)""")
+    cur1.execute("""CREATE INDEX IF NOT EXISTS plazma_files_hash on plazma_files(hash)""")
+    cur1.execute("""CREATE TABLE IF NOT EXISTS plazma_dirs(
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    children TEXT)""")
+    cur1.execute("""CREATE TABLE IF NOT EXISTS plazma_quarantine(
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    hash TEXT,
+    error TEXT,
+    dt_error TIMESTAMP)""")
+    if 'mtime_ns' not in declared_types(cur1, 'plazma_quarantine'):  # таблица создана до сохранения mtime_ns
+        cur1.execute("""ALTER TABLE plazma_quarantine ADD COLUMN mtime_ns INTEGER""")
+    cur1.connection.commit()
+
+    cur1.execute("""SELECT path, mtime, children FROM plazma_dirs""")
+    dirs_state = dict() if full_scan1 else {i[0]: (i[1], i[2]) for i in cur1.fetchall()}
+
+    files, dirs = scan_plazma_dirs(path1, dirs_state)
+    files.extend(quarantined_plazma_files(cur1, files))
+
+    cur1.execute("""CREATE TEMP TABLE IF NOT EXISTS plazma_candidates(
+    path TEXT,
+    base_name TEXT,
+    dt_change TIMESTAMP)""")
+    cur1.execute("""DELETE FROM plazma_candidates""")
+    cur1.executemany("""INSERT INTO plazma_candidates(path,base_name,dt_change) VALUES (?,?,?)""", files)
+    cur1.execute("""SELECT c.path, c.base_name, c.dt_change FROM plazma_candidates c
+                    WHERE NOT EXISTS (SELECT 1 FROM plazma_files f
+                                      WHERE f.base_name = c.base_name AND f.dt_change = c.dt_change)
+                    ORDER BY c.dt_change""")
+    need_files = pd.DataFrame(data=cur1.fetchall(), columns=['path', 'base_name', 'dt_change'])
+    cur1.execute("""DELETE FROM plazma_candidates""")
+    cur1.connection.commit()
+    need_files['dt_change'] = pd.to_datetime(need_files['dt_change'])
+
+    cur1.execute("""SELECT path, size, mtime_ns, hash FROM plazma_quarantine""")
+    quarantine = {i[0]: i[1:] for i in cur1.fetchall()}
+    fingerprints, unreadable, skipped = [], [], []
+    for i in need_files.path.values:
+        try:
+            stat = os.stat(i)
+            if quarantine.get(i, (None, None))[:2] == (stat.st_size, stat.st_mtime_ns):
+                skipped.append(i)  # непрочитанная ранее карта не менялась, хэш не пересчитываем
+                continue
+            fingerprints.append((*file_fingerprint(i), stat.st_mtime_ns))
+        except OSError as e:  # карту удалили после просмотра папки или она занята другим процессом
+            unreadable.append((i, f'{type(e).__name__}: {e}'))
+    need_files = need_files[~need_files.path.isin(skipped + [i[0] for i in unreadable])]
+    need_files['size'] = pd.Series([i[0] for i in fingerprints], index=need_files.index, dtype='int64')
+    need_files['mtime_ns'] = pd.Series([i[2] for i in fingerprints], index=need_files.index, dtype='int64')
+    need_files['hash'] = pd.Series([i[1] for i in fingerprints], index=need_files.index, dtype='object')
+
+    same_hash = pd.Series(
+        [quarantine.get(path, (None, None, None))[::2] == (size, hash_)
+         for path, size, hash_ in zip(need_files.path, need_files['size'], need_files.hash)],
+        index=need_files.index, dtype='bool'
+    )  # у карты обновилась только дата изменения, запоминаем новую, чтобы больше не считать хэш
+    cur1.executemany(
+        """UPDATE plazma_quarantine SET mtime_ns = ? WHERE path = ?""",
+        list(zip(need_files.mtime_ns[same_hash].tolist(), need_files.path[same_hash]))
+    )
+    need_files = need_files[~same_hash]  # непрочитанные ранее карты пропускаем, пока файл не изменится
+    inbase_hashes = set()
+    hashes = list(set(need_files.hash.values))
+    for i in range(0, len(hashes), 500):  # ограничение на кол-во параметров в запросе
+        chunk = hashes[i:i + 500]
+        cur1.execute(f"""SELECT DISTINCT size, hash FROM plazma_files
+                         WHERE hash IN ({','.join(['?'] * len(chunk))})""", chunk)
+        inbase_hashes.update(cur1.fetchall())
+    need_files['duplicate'] = (
+            pd.Series(list(zip(need_files['size'], need_files.hash)), index=need_files.index, dtype='object')
+            .isin(inbase_hashes) |
+            need_files.duplicated(subset=['size', 'hash'])
+    )  # карта уже загружена или повторяется в этой загрузке (остается первая по dt_change)
+    return need_files, dirs, unreadable
+
+
+def quarantined_plazma_files(cur1, files1) -> list:
+    """
+    Возвращает карты из plazma_quarantine, которых нет среди найденных scan_plazma_dirs файлов.
+    Перезапись карты на месте не меняет дату изменения папки, поэтому такие карты проверяются каждый раз
+
+    :arg cur1 - объект sqlite3.connection.cursor
+    :arg files1 - list с (путь к файлу, basename, datetime изменения файла) из scan_plazma_dirs
+    :return list в том же формате, удаленные карты пропускаются
+    """
+    scanned = {i[0] for i in files1}
+    cur1.execute("""SELECT path FROM plazma_quarantine""")
+    files = []
+    for (path,) in cur1.fetchall():
+        if path in scanned:
+            continue
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            continue
+        files.append((path, os.path.basename(path), dt.datetime.fromtimestamp(mtime)))
+    return files
 
-        cur.execute("""SELECT path, base_name, dt_change FROM plazma_files""")
 
-        inbase_files = pd.DataFrame(data=cur.fetchall(), columns=['path', 'base_name', 'dt_change'])
-        inbase_files['ind'] = (
-                inbase_files.base_name +
-                inbase_files.dt_change.map(lambda x: x.strftime("%Y-%m-%d %H:%M:%S.%f"))
-        )                                              # индикатор, состоящий из base_name и dt_change
+def quarantine_plazma_files(cur1, table1, errors1) -> None:
+    """
+    Записывает непрочитанные карты в plazma_quarantine вместе с отпечатком файла и mtime_ns и убирает оттуда
+    карты, которые загрузились после изменения файла !без commit!
 
-        need_files = get_plazma_files(path1)
-        need_files['ind'] = (
-                need_files.base_name +
-                need_files.dt_change.map(lambda x: x.strftime("%Y-%m-%d %H:%M:%S.%f"))
-        )                                                  # индикатор, состоящий из base_name и dt_change
-        need_files = need_files[~need_files['path'].isin(exceptions_)]  # убираем файлы, которые не читаеются etc
+    :arg cur1 - объект sqlite3.connection.cursor
+    :arg table1 - таблица pd.Dataframe из need_plazma_files
+    :arg errors1 - list с (путь к файлу, текст ошибки) из need_plazma_files и collect_plazma_data,
+    у файлов без отпечатка size, mtime_ns и hash пустые
+    """
+    fingerprints = dict(zip(
+        table1.path.values,
+        zip(table1['size'].values.tolist(), table1.mtime_ns.values.tolist(), table1.hash.values)
+    ))
+    now = dt.datetime.now()
+    cur1.executemany(
+        """INSERT OR REPLACE INTO plazma_quarantine(path,size,mtime_ns,hash,error,dt_error) VALUES (?,?,?,?,?,?)""",
+        [(path, *fingerprints.get(path, (None, None, None)), error, now) for path, error in errors1]
+    )
+    failed = {i[0] for i in errors1}
+    cur1.executemany(
+        """DELETE FROM plazma_quarantine WHERE path = ?""",
+        [(i,) for i in table1.path.values if i not in failed]
+    )
+    for path, error in errors1:
+        log_message(f"plazma card in quarantine: {path} - {error}")
 
-        need_set = set(need_files.ind.values) - set(inbase_files.ind.values)  # need_set - множество с индикаторами, которые надо добавить
-        need_files = need_files[['path', 'base_name', 'dt_change']][need_files.ind.isin(need_set)]
-        need_files = need_files.sort_values(by=['dt_change'])
-        return need_files
 
+def file_fingerprint(path1, block1=1048576) -> tuple:
+    """
+    Отпечаток содержимого файла: размер и blake2b от байтов файла.
+    Совпадает у копий карты и у карты, которой только обновили дату изменения
 
-def get_plazma_files(path1) -> pd.DataFrame:
+    :arg path1 - путь к файлу
+    :arg block1 - размер блока чтения в байтах
+    :return (размер в байтах, hex строка хэша)
     """
-    Возвращает таблицу с информацией по файлам PLAZMA
+    hash_ = hashlib.blake2b(digest_size=16)
+    size = 0
+    with open(path1, 'rb') as f:
+        for block in iter(lambda: f.read(block1), b''):
+            hash_.update(block)
+            size += len(block)
+    return size, hash_.hexdigest()
 
-    :arg path1 - путь к папке с файлами по плазме
 
-    :return pd.DataFrame (
-    1 колонка - путь к файлу
-    2 колонка - basename
-    3 колонка - datetime изменения файла
-    )
+def fill_plazma_fingerprints(cur1) -> None:
     """
-    files = os.walk(path1)
-    files = [r[0] + '\\' + i for r in files for i in r[2] if len(r[2]) > 0 if 'xls' in i]  # choice only xls files
-    files = pd.DataFrame(data=files, columns=['path'])
-    files['base_name'] = files['path'].map(lambda x: os.path.basename(x))
-    files['dt_change'] = files['path'].map(date_accounting_file(method='change'))
-    files = files.sort_values(by='dt_change')
-    return files
+    Заполняет size и hash для файлов, загруженных до появления отпечатков, чтобы их копии тоже не загружались.
+    Файлы, которых больше нет, остаются без отпечатка
 
+    :arg cur1 - объект sqlite3.connection.cursor
+    """
+    cur1.execute("""SELECT id, path FROM plazma_files""")
+    rows = []
+    for id_, path in cur1.fetchall():
+        try:
+            rows.append((*file_fingerprint(path), id_))
+        except OSError:
+            continue
+    cur1.executemany("""UPDATE plazma_files SET size = ?, hash = ? WHERE id = ?""", rows)
 
-def date_accounting_file(method: str = 'create'):
-    """Выбираем какую дату учета файла использовать"""
-    if method == 'create':
-        return lambda x: dt.datetime.fromtimestamp(os.path.getctime(x))
-    elif method == 'change':
-        return lambda x: dt.datetime.fromtimestamp(os.path.getmtime(x))
-    else:
-        raise MethodAccountingFileError
 
+def scan_plazma_dirs(path1, dirs_state1: dict) -> tuple:
+    """
+    Просматривает папки с файлами по плазме через os.scandir (дата изменения берется из результата scandir,
+    без отдельного stat на каждый файл). Папки, дата изменения которых совпадает с сохраненной в plazma_dirs,
+    не просматриваются, проверяются только их подпапки.
+    Дата изменения папки меняется при добавлении, удалении и переименовании файлов,
+    перезапись файла на месте без смены папки не видна - такие карты находит полный просмотр
+    (full_scan1 в load_plazma_tables: первая загрузка за день или run.py --full-scan)
+
+    :arg path1 - путь к папке с файлами по плазме
+    :arg dirs_state1 - dict {путь к папке: (mtime, подпапки через '\\n')} из plazma_dirs
+    :return (
+    list с (путь к файлу, basename, datetime изменения файла) по xls файлам из измененных папок,
+    list с (путь к папке, mtime, подпапки через '\\n') по измененным папкам
+    )
+    """
+    files, dirs = [], []
+    stack = [(path1, os.stat(path1).st_mtime)]
+    while stack:
+        path, mtime = stack.pop()
+        state = dirs_state1.get(path)
+        if state is not None and state[0] == mtime:  # в папке ничего не менялось, смотрим только подпапки
+            for child in filter(None, state[1].split('\n')):
+                try:
+                    stack.append((child, os.stat(child).st_mtime))
+                except FileNotFoundError:
+                    continue
+            continue
+
+        children = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    children.append(entry.path)
+                    stack.append((entry.path, entry.stat().st_mtime))
+                elif 'xls' in entry.name and entry.is_file():  # choice only xls files
+                    files.append((entry.path, entry.name, dt.datetime.fromtimestamp(entry.stat().st_mtime)))
+        dirs.append((path, mtime, '\n'.join(children)))
+    return files, dirs
+
+
+def update_plazma_dirs(cur1, dirs1) -> None:
+    """
+    Сохраняет состояние просмотренных папок в plazma_dirs !без commit!
+
+    :arg cur1 - объект sqlite3.connection.cursor
+    :arg dirs1 - list с (путь к папке, mtime, подпапки через '\\n') из scan_plazma_dirs
+    """
+    cur1.executemany("""INSERT OR REPLACE INTO plazma_dirs(path,mtime,children) VALUES (?,?,?)""", dirs1)
 
-def collect_plazma_data(pl_files1, table1) -> pd.DataFrame:
+
+def collect_plazma_data(pl_files1, table1, max_workers1=None) -> tuple:
     """
     Функция собирает данные из файловпо плазме и формирует таблицу для загрузки в базу bd_oemz.bd3.
     Используются практически все параметры, указанные в файле (на возможное будущее)
     Столбцы с time измеряются в секундах
+    Карты читаются параллельно в нескольких процессах, если их больше MIN_FILES_FOR_POOL и max_workers1 != 1.
+    Карты, которые не удалось прочитать или разобрать, не попадают в таблицу и возвращаются отдельно с ошибкой
 
     :arg pl_files1 - список файлов like numpy.array
     :arg table1 - таблица pd.Dataframe из need_plazma_files
-    :return pd.DataFrame с информацией из карты
-    """
-    coordinates = ((3, 2), (6, 2), (6, 7),
-                   (14, 3), (16, 3),
-                   (14, 5), (15, 5), (16, 5),
-                   (14, 7), (15, 7),
-                   (14, 11), (15, 11), (16, 11), (18, 11),
-                   (14, 13), (15, 13), (16, 13))  # координаты нужных ячеек в формате (row, col)
+    :arg max_workers1 - кол-во процессов, None - по кол-ву ядер, 1 - читать в текущем процессе
+    :return (pd.DataFrame с информацией из карты, list с (путь к файлу, текст ошибки) по непрочитанным картам)
+    """
     cols_name = ('path', 'dt_change',
                  'path_in', 'size', 'mass',
                  'cut_amount', 'stub_amount',
@@ -161,66 +365,135 @@ def collect_plazma_data(pl_files1, table1) -> pd.DataFrame:
                  'cut_square', 'move_square', 'stub_square', 'umc',
                  'cut_weight', 'move_weight', 'stub_weight')  # umc - use material coef
 
-    data = []
-    for f in pl_files1:  # собирает данные в цикле в список
-        row = list()
-        row.append(f)  # первое значение путь к файлу
-        row.append(table1['dt_change'][table1.path == f].values[0])  # второе значение дата изменения
+    pl_files1 = list(pl_files1)
+    if max_workers1 == 1 or len(pl_files1) < MIN_FILES_FOR_POOL:
+        results = [parse_plazma_card(f) for f in pl_files1]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers1) as pool:  # map сохраняет порядок файлов
+            results = list(pool.map(parse_plazma_card, pl_files1, chunksize=32))
 
-        book = xlrd.open_workbook(f, encoding_override='ansi', logfile=open(os.devnull, 'w'))
-        sheet = book.sheet_by_index(0)
-        for i in coordinates:  # заполняются значения из файла начиная с третьего места в row
-            row.append(sheet.cell_value(*i))
-        data.append(row)
+    dt_changes = dict(zip(table1.path.values, table1.dt_change.values))  # дата изменения по пути к файлу
+    data = [[f, dt_changes[f], *row] for f, (row, error) in zip(pl_files1, results) if error is None]
+    errors = [(f, error) for f, (row, error) in zip(pl_files1, results) if error is not None]
 
     data = pd.DataFrame(data=data, columns=cols_name)
+    bad_numbers = 0
     for i in data.columns[4:]:  # преобразовывает значения в цифры
-        data[i] = data[i].map(del_empty)
-        data[i] = data[i].map(float)
-
-    data['size'] = data['size'].map(get_sizes)
-    data['size_length'], data['size_width'], data['size_thickness'] = \
-        data['size'].map(lambda x: int(x[0])), data['size'].map(lambda x: int(x[1])), data['size'].map(lambda x: int(x[2]))
+        data[i], bad = to_numbers(data[i])
+        bad_numbers += bad
+
+    codes, uniques = pd.factorize(data['size'].astype('string'))  # размеров листа немного, разбираем только уникальные
+    sizes = pd.Series(uniques, dtype='string').str.extract(SIZE_PATTERN)  # '6010mmx1500mmx4mm' => длина, ширина, толщина
+    sizes = sizes.reindex(codes).set_axis(data.index)  # код -1 (пустое значение) дает NaN
+    for i in sizes.columns:
+        data[i] = sizes[i].astype('Int32')
     del data['size']
-    return data
+
+    bad_sizes = int(sizes.isna().any(axis=1).sum())
+    if bad_numbers or bad_sizes:
+        log_message(f"plazma cards: {bad_numbers} bad numbers, {bad_sizes} bad sizes replaced with NaN")
+    return data, errors
 
 
-def del_empty(x) -> Union[str, int]:
+def to_numbers(series1) -> tuple:
     """
-    Удаляем лишние эелементы из цифр и заменяем '' на 0
+    Переводит столбец значений из карты в float: у строк удаляются пробелы, пустая строка заменяется на 0,
+    значения, которые не получилось перевести в число, заменяются на NaN.
+    Сначала переводится весь столбец, строки чистятся только там, где перевод не получился
 
-    :arg x - элемент в Series
+    :arg series1 - pd.Series со значениями ячеек (числа и строки)
+    :return (pd.Series float64, кол-во значений, замененных на NaN)
     """
-    if type(x) is str:
-        x = x.strip()
-        x = x.replace(' ', '')
-    if x == '':
-        x = 0
-    return x
+    numbers = pd.to_numeric(series1, errors='coerce').astype('float64')
+    failed = numbers.isna() & series1.notna()
+    if failed.any():
+        codes, uniques = pd.factorize(series1[failed].astype(object))  # в основном это одинаковые пустые строки
+        try:
+            text = pd.Series(uniques, dtype=object).str.replace(r'\s', '', regex=True)  # у не строк будет NaN
+        except AttributeError:  # среди непереведенных значений нет строк
+            text = pd.Series(None, index=range(len(uniques)), dtype=object)
+        text = text.mask(text.eq(''), '0')
+        numbers[failed] = pd.to_numeric(text, errors='coerce').astype('float64').to_numpy()[codes]
+    return numbers, int((numbers.isna() & series1.notna()).sum())
+
+
+def parse_plazma_card(path1: str) -> tuple:
+    """
+    Читает карту по плазме. Ошибка не прерывает загрузку остальных карт,
+    а возвращается вместо значений, чтобы карта попала в plazma_quarantine
 
+    :arg path1 - путь к файлу карты
+    :return (list со значениями ячеек в порядке COORDINATES, None) или (None, текст ошибки)
+    """
+    try:
+        return read_plazma_card(path1), None
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'
 
-def get_sizes(text_size) -> list:
+
+def read_plazma_card(path1: str) -> list:
     """
-    Пребразует текстовое поле формата '6010mmx1500mmx4mm' в 3 величины: длина, ширина, толщина
+    Читает нужные ячейки из карты по плазме. Функция уровня модуля, чтобы ее можно было выполнять в ProcessPoolExecutor
 
-    :arg text_size - текстовое поле формата '6010mmx1500mmx4mm'
-    :return list(length, width, sickness)  - length, width, sickness in str
+    :arg path1 - путь к файлу карты
+    :raise PlazmaCardError если файл не карта: сводная книга по имени или в ячейках нет ни пути к программе,
+    ни размера листа
+    :return list со значениями ячеек в порядке COORDINATES
     """
-    text_size = text_size.replace('x', '')
-    text_size = text_size.split('mm')
-    return text_size
+    if NOT_CARD_PATTERN.search(os.path.basename(path1)):
+        raise PlazmaCardError(path1)
+    if path1.lower().endswith(('.xlsx', '.xlsm')):
+        cells = read_xlsx_cells(path1, COORDINATES)
+    else:
+        cells = read_xls_cells(path1, COORDINATES)
+
+    path_in, size = cells[:2]
+    if not str(path_in).strip() and re.search(SIZE_PATTERN, str(size)) is None:
+        raise PlazmaCardError(path1)
+    return cells
 
 
-def insert_records_of_loads(cur1, name1) -> None:
+def read_xls_cells(path1: str, coordinates1) -> list:
     """
-    Добавляет запись о добавлении данных в нужную таблицу в базе bd_oemz.bd3 !без commit!
+    Читает ячейки первого листа .xls файла. Книга открывается с on_demand=True, поэтому разбирается только первый лист
 
-    :arg name1 - наименование таблицы, куда добавилась запись, string like 'inputs'
-    :arg cur1 - объект sqlite3.connection.cursor
+    :arg path1 - путь к .xls файлу
+    :arg coordinates1 - координаты ячеек в формате (row, col), нумерация с 0
+    :return list со значениями ячеек в порядке coordinates1, пустые ячейки - ''
+    """
+    with open(os.devnull, 'w') as logfile:
+        book = xlrd.open_workbook(path1, encoding_override='ansi', logfile=logfile, on_demand=True)
+        try:
+            sheet = book.sheet_by_index(0)
+            return [sheet.cell_value(*i) for i in coordinates1]
+        finally:
+            book.release_resources()
+
+
+def read_xlsx_cells(path1: str, coordinates1) -> list:
+    """
+    Читает ячейки первого листа .xlsx файла в режиме read_only: строки листа читаются потоком
+    и только до последней нужной строки, значения приводятся к виду как у xlrd
+
+    :arg path1 - путь к .xlsx файлу
+    :arg coordinates1 - координаты ячеек в формате (row, col), нумерация с 0
+    :return list со значениями ячеек в порядке coordinates1, пустые ячейки - ''
     """
-    cur1.execute("""CREATE TABLE IF NOT EXISTS records_of_loads(
-                    id INTEGER PRIMARY KEY,
-                    date TIMESTAMP NOT NULL,
-                    table_ TEXT NOT NULL)""")
-    row = (dt.datetime.now(), name1)
-    cur1.execute("""INSERT INTO records_of_loads(date,table_) VALUES (?,?)""", row)
+    max_row = max(i[0] for i in coordinates1) + 1
+    max_col = max(i[1] for i in coordinates1) + 1
+    book = openpyxl.load_workbook(path1, read_only=True, data_only=True)
+    try:
+        sheet = book.worksheets[0]
+        rows = list(sheet.iter_rows(min_row=1, max_row=max_row, max_col=max_col, values_only=True))
+    finally:
+        book.close()
+
+    values = []
+    for r, c in coordinates1:
+        value = rows[r][c] if r < len(rows) and c < len(rows[r]) else None
+        if value is None:  # xlrd отдает пустые ячейки как ''
+            value = ''
+        elif isinstance(value, int) and not isinstance(value, bool):  # xlrd отдает все числа как float
+            value = float(value)
+        values.append(value)
+    return values
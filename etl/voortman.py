@@ -1,7 +1,7 @@
 """ETL voortman data"""
 
 from common.database import conn_pobeda
-from common.common import date_range
+from common.common import date_grid
 from pandas import read_sql_query, DataFrame, read_csv
 from datetime import date
 from math import ceil
@@ -130,13 +130,12 @@ def general_table() -> None:
     details['KPD'] = details['full_time'] / (10.75 * 2 / 24)  # не по сменам, а по дням
     details['KIO'] = details['full_time'] / (12 * 2 / 24)  # не по сменам, а по дням
 
-    dates = date_range(details.loc[:, 'date_done'])\
-        ['date'].\
-        unique()
-    table = DataFrame(data=dates, columns=['date_done']).\
-        sort_values(by='date_done', ascending=False).\
-        merge(details, on='date_done', how='left').\
-        fillna(value=0)
+    dates = date_grid(details.loc[:, 'date_done'], smenas1=0)
+    table = details.set_index('date_done').\
+        reindex(dates.rename('date_done')).\
+        fillna(value=0).\
+        reset_index().\
+        sort_values(by='date_done', ascending=False)
 
     need_columns = [
         'date_done', 'KPD', 'KIO',
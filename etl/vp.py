@@ -2,16 +2,22 @@
 
 import datetime as dt
 import glob
+import io
+import os
+import traceback
 import pandas as pd
-import re
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from common.common import (
-    parse_date_path, zero_time_dt, to_datetime_in_list
+    parse_date_path, zero_time_dt, log_message
 )
+from common.error import VpLoadError
 from common.database import (
-    conn_bd_oemz, insert_records_of_loads, symbols_for_query
+    conn_bd_oemz, insert_records_of_loads, bulk_insert, update_shift_stats
 )
 
+FINISHED_FILE_SECONDS = 60 * 60  # файл, который не менялся столько секунд, считается дописанным
+
 
 def load_vp(name_table1: str) -> None:
     """
@@ -22,63 +28,158 @@ def load_vp(name_table1: str) -> None:
     name_table1 = name_table1.lower()  # поменялись пути к файлам, теперь они с заклавными буквами
     with conn_bd_oemz() as conn:
         cur = conn.cursor()
+        last_date, inbase_files = vp_load_state(cur, name_table1)
+        done_table, table_files = prepare_vp_data(name_table1, last_date, inbase_files)
+        write_vp_data(cur, name_table1, done_table, table_files)
+        conn.commit()
 
+
+def load_vp_parallel(names_table1, max_workers1=None) -> None:
+    """
+    Загружает данные по нескольким станкам параллельно: чтение и преобразование txt файлов каждой линии идет
+    в отдельном процессе, а в базу bd_oemz.bd3 пишет только текущий процесс через одно соединение,
+    так что sqlite не видит конкурирующих записей.
+    Падение одной линии пишется в лог с traceback и не мешает загрузке остальных, после записи
+    остальных линий поднимается VpLoadError, чтобы этап load_vp считался упавшим
+
+    :arg names_table1 - список наименований таблиц like ('vp_164', 'vp_184', 'vpx_94')
+    :arg max_workers1 - кол-во процессов, None - по кол-ву ядер
+    :raise VpLoadError со списком упавших линий
+    """
+    names_table1 = [i.lower() for i in names_table1]
+    states = dict()  # last_date и таблица vp_files по каждой линии
+    failed = []
+    with conn_bd_oemz() as conn:
+        cur = conn.cursor()
+        for name in names_table1:
+            try:
+                states[name] = vp_load_state(cur, name)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                failed.append(name)
+                log_message(f"load_vp({name}) was down\n{traceback.format_exc()}")
+
+    with ProcessPoolExecutor(max_workers=max_workers1) as pool:
+        futures = {pool.submit(prepare_vp_data, name, *states[name]): name for name in states}
+        with conn_bd_oemz() as conn:
+            cur = conn.cursor()
+            for future in as_completed(futures):  # линии пишутся в базу по мере готовности
+                name = futures[future]
+                try:
+                    write_vp_data(cur, name, *future.result())
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    failed.append(name)
+                    log_message(f"load_vp({name}) was down\n{traceback.format_exc()}")
+    if failed:
+        raise VpLoadError(failed)
+
+
+def vp_load_state(cur1, name_table1) -> tuple:
+    """
+    Создает таблицу станка, если ее не существует, и возвращает то, что нужно для чтения новых данных
+
+    :arg cur1 - объект sqlite3.connection.cursor
+    :arg name_table1 - наименование таблицы либо 'vp_164', 'vp_184', либо 'vpx_94'
+    :return last_date - дата и время последней записи в таблице,
+    inbase_files - pd.DataFrame с загруженными файлами из таблицы vp_files
+    """
+    if name_table1 == 'vp_184':
+        cur1.execute(f"""CREATE TABLE IF NOT EXISTS {name_table1}(
+        id INTEGER PRIMARY KEY,
+        c_0 TIMESTAMP,          
+        c_4 TEXT,           c_3 TEXT,               
+        c_100 REAL,         c_101 TEXT,               
+        c_7 INTEGER,        c_17 INTEGER,
+        c_9 REAL)""")  # создание таблицы, если ее не существует
+    else:
+        cur1.execute(f"""CREATE TABLE IF NOT EXISTS {name_table1}(
+        id INTEGER PRIMARY KEY,
+        c_0 TIMESTAMP,          
+        c_1 TEXT,           c_2 TEXT,               
+        c_3 TEXT,           c_4 TEXT,               
+        c_5 REAL,           c_7 INTEGER,
+        c_8 INTEGER,        c_9 REAL,
+        c_10 INTEGER,       c_11 INTEGER,
+        c_12 INTEGER,       c_13 INTEGER,
+        c_14 INTEGER,       c_15 INTEGER,
+        c_16 INTEGER,       c_17 INTEGER,
+        c_18 INTEGER,       c_19 INTEGER,
+        c_20 INTEGER,       c_21 INTEGER,
+        c_22 INTEGER,       c_23 INTEGER,
+        c_24 INTEGER,       c_25 INTEGER,
+        c_26 TEXT,          c_27 TEXT,
+        c_28 TEXT,          c_29 TEXT,
+        c_30 TEXT,          c_31 TEXT,
+        c_32 TEXT,          c_33 TEXT,
+        c_34 TEXT,          c_35 TEXT,
+        c_36 TEXT,          c_37 TEXT,
+        c_38 TEXT,          c_39 REAL,
+        c_40 REAL,          c_41 REAL,
+        c_42 TEXT,          c_43 TEXT,
+        c_44 REAL,          c_45 REAL,
+        c_46 REAL,          c_47 TEXT)""")  # создание таблицы, если ее не существует
+
+    cur1.execute(f""" CREATE INDEX IF NOT EXISTS {name_table1}_date
+                    on {name_table1}(c_0)""")
+
+    last_date = last_date_from_vp_db(cur1, name_table1)  # получение даты и времени последней записи в таблице
+    inbase_files = inbase_vp_files(cur1, name_table1)  # загруженные файлы с размерами и смещениями
+    return last_date, inbase_files
+
+
+def prepare_vp_data(name_table1, last_date1, inbase_files1) -> tuple:
+    """
+    Читает новые данные из txt файлов станка и преобразует их для загрузки в базу. В базу не обращается,
+    поэтому может выполняться в отдельном процессе
+
+    :arg name_table1 - наименование таблицы либо 'vp_164', 'vp_184', либо 'vpx_94'
+    :arg last_date1 - дата и время последней записи в таблице
+    :arg inbase_files1 - таблица загруженных файлов из inbase_vp_files
+    :return done_table - pd.DataFrame с данными для загрузки (None, если новых строк нет),
+    table_files - pd.DataFrame из vp_files_to_read для обновления таблицы vp_files
+    """
+    # можут быть поменять путь
+    table_files = load_list_files_vp(name_table1)  # список всех путей к файлам и даты файлов
+    filter_date = (table_files.date >= zero_time_dt(last_date1))   # фильтр таблицы, где выбираются файлы с датой >= последней дате из базы
+    table_files = table_files[filter_date]
+    table_files = vp_files_to_read(table_files, inbase_files1)  # только новые и дописанные файлы с границами чтения
+
+    done_table = None
+    read_files = table_files[table_files.end_offset > table_files.start_offset]  # файлы с новыми полными строками
+    if len(read_files) > 0:
+        time_col = 5 if name_table1 == 'vp_184' else 6  # столбец со временем в txt файле
+        parts = (
+            (read_vp_part(i.path, i.start_offset, i.end_offset), None if i.tracked else last_date1)
+            for i in read_files.itertuples()
+        )  # дописанные после сохраненного смещения части берутся целиком, в новых файлах только строки позже last_date
+        done_table = table_from_txt(parts, time_col, chunksize1=100000)
         if name_table1 == 'vp_184':
-            cur.execute(f"""CREATE TABLE IF NOT EXISTS {name_table1}(
-            id INTEGER PRIMARY KEY,
-            c_0 TIMESTAMP,          
-            c_4 TEXT,           c_3 TEXT,               
-            c_100 REAL,         c_101 TEXT,               
-            c_7 INTEGER,        c_17 INTEGER,
-            c_9 REAL)""")  # создание таблицы, если ее не существует
-        else:
-            cur.execute(f"""CREATE TABLE IF NOT EXISTS {name_table1}(
-            id INTEGER PRIMARY KEY,
-            c_0 TIMESTAMP,          
-            c_1 TEXT,           c_2 TEXT,               
-            c_3 TEXT,           c_4 TEXT,               
-            c_5 REAL,           c_7 INTEGER,
-            c_8 INTEGER,        c_9 REAL,
-            c_10 INTEGER,       c_11 INTEGER,
-            c_12 INTEGER,       c_13 INTEGER,
-            c_14 INTEGER,       c_15 INTEGER,
-            c_16 INTEGER,       c_17 INTEGER,
-            c_18 INTEGER,       c_19 INTEGER,
-            c_20 INTEGER,       c_21 INTEGER,
-            c_22 INTEGER,       c_23 INTEGER,
-            c_24 INTEGER,       c_25 INTEGER,
-            c_26 TEXT,          c_27 TEXT,
-            c_28 TEXT,          c_29 TEXT,
-            c_30 TEXT,          c_31 TEXT,
-            c_32 TEXT,          c_33 TEXT,
-            c_34 TEXT,          c_35 TEXT,
-            c_36 TEXT,          c_37 TEXT,
-            c_38 TEXT,          c_39 REAL,
-            c_40 REAL,          c_41 REAL,
-            c_42 TEXT,          c_43 TEXT,
-            c_44 REAL,          c_45 REAL,
-            c_46 REAL,          c_47 TEXT)""")  # создание таблицы, если ее не существует
-
-        cur.execute(f""" CREATE INDEX IF NOT EXISTS {name_table1}_date
-                        on {name_table1}(c_0)""")
-
-        last_date = last_date_from_vp_db(cur, name_table1)  # получение даты и времени последней записи в таблице
-        # можут быть поменять путь
-        table_files = load_list_files_vp(name_table1)  # список всех путей к файлам и даты файлов
-        filter_date = (table_files.date >= zero_time_dt(last_date))   # фильтр таблицы, где выбираются файлы с датой >= последней дате из базы
-        table_files = table_files[filter_date]
-
-        done_table = table_from_txt(table_files.path.values)  # таблица из txt файлов по нужным файлам (датам)
-        if name_table1 == 'vp_184':
-            done_table = reshape_table_for_vp_184(done_table, last_date)
+            done_table = reshape_table_for_vp_184(done_table)
         else:
-            done_table = reshape_table_from_txt(done_table, last_date)  # таблица из txt файл
+            done_table = reshape_table_from_txt(done_table)  # таблица из txt файл
+    return done_table, table_files
 
-        columns_for_query_1, symbols_for_query_1 = symbols_for_query(name_table1, cur)  # списки колонок и вопросиков для запроса
-        query_1 = f"""INSERT INTO {name_table1}({columns_for_query_1}) VALUES ({symbols_for_query_1})"""
-        cur.executemany(query_1, done_table)
-        insert_records_of_loads(cur, name_table1)
-        conn.commit()
+
+def write_vp_data(cur1, name_table1, done_table1, table_files1) -> None:
+    """
+    Записывает подготовленные prepare_vp_data данные в таблицу станка, обновляет итоги затронутых смен
+    в shift_stats и vp_files !без commit!
+
+    :arg cur1 - объект sqlite3.connection.cursor
+    :arg name_table1 - наименование таблицы либо 'vp_164', 'vp_184', либо 'vpx_94'
+    :arg done_table1 - pd.DataFrame с данными для загрузки или None
+    :arg table_files1 - pd.DataFrame из vp_files_to_read
+    """
+    rows, start = 0, None
+    if done_table1 is not None:
+        rows = bulk_insert(cur1, name_table1, done_table1)  # столбцы по порядку как в таблице станка
+        start = done_table1.iloc[:, 0].min() if rows else None  # с этой смены пересчитываются итоги в shift_stats
+    update_shift_stats(cur1, name_table1, start)
+    update_vp_files(cur1, name_table1, table_files1)
+    insert_records_of_loads(cur1, name_table1, rows)
 
 
 def last_date_from_vp_db(cur1, name_table1) -> dt.datetime:
@@ -99,75 +200,104 @@ def last_date_from_vp_db(cur1, name_table1) -> dt.datetime:
     return last_date
 
 
-def table_from_txt(paths1) -> pd.DataFrame:
+def table_from_txt(paths1, time_col1=6, chunksize1=None) -> pd.DataFrame:
+    """
+    Собирает таблицу из текстовых файлов по станкам vp, файлы уже взяты с нужной датой.
+    Таблицы по файлам объединяются одним pd.concat в конце, а не на каждой итерации
+
+    :arg paths1, time_col1, chunksize1 - см. iter_tables_from_txt
     """
-    Собирает в цикле таблицу из текстовых файлов по станкам vp, файлы уже взяты с нужной датой
+    tables = list(iter_tables_from_txt(paths1, time_col1, chunksize1))
+    if len(tables) == 0:
+        return pd.DataFrame()
+    return pd.concat(tables, ignore_index=True)
+
 
-    :arg paths1 - список путей к нужным файлам (которые удовлетворяют по дате из filter_date),
-    буду добавлять туда table_files.path.values
+def iter_tables_from_txt(paths1, time_col1=6, chunksize1=None):
     """
-    done_table = pd.DataFrame()
-    for i in paths1:
-        cur_table = pd.read_csv(i, sep=';', encoding='ansi', header=None)
-        done_table = pd.concat([done_table, cur_table])
-    return done_table
+    Генератор таблиц из текстовых файлов по станкам vp, по одной таблице на файл.
+    Если задан chunksize1, то файл читается частями и из каждой части сразу отбрасываются строки с датой
+    не позже last_date файла, так что в памяти копятся только новые данные
+
+    :arg paths1 - список пар (путь к файлу или файловый объект из read_vp_part, last_date): last_date - дата
+    и время последней записи из таблицы, None - ничего не отбрасывать (часть после сохраненного смещения)
+    :arg time_col1 - номер столбца со временем в txt файле (6, на линии 184 - 5)
+    :arg chunksize1 - кол-во строк в одной части файла, None - файл читается целиком
+    """
+    for i, last_date in paths1:
+        if chunksize1 is None:
+            chunks = [pd.read_csv(i, sep=';', encoding='ansi', header=None)]
+        else:
+            chunks = pd.read_csv(i, sep=';', encoding='ansi', header=None, chunksize=chunksize1)
+        yield pd.concat(
+            [filter_chunk_by_date(chunk, last_date, time_col1) for chunk in chunks],
+            ignore_index=True
+        )
 
 
-def reshape_table_from_txt(table1, last_date1) -> pd.DataFrame:
+def filter_chunk_by_date(table1, last_date1, time_col1) -> pd.DataFrame:
+    """
+    Оставляет в части txt файла только строки с датой и временем позже last_date1
+
+    :arg table1 - часть txt файла в формате pandas.DataFrame
+    :arg last_date1 - дата и время последней записи из таблицы, None - ничего не отбрасывать
+    :arg time_col1 - номер столбца со временем в txt файле
+    """
+    if last_date1 is None:
+        return table1
+    return table1[vp_datetime(table1[0], table1[time_col1]) > last_date1]
+
+
+def reshape_table_from_txt(table1) -> pd.DataFrame:
     """
     Преобразование таблицы из функции table_from_txt() для загрузки в базу
         - объединяет столбцы 0 и 6 в один столбец 0 с форматом datetime (автоматом в timestamp переводится)
         - 6 столбец удаляется
-        - выбираются данные после последней записи в таблице
-        - преобразовывает из pandas.DataFrame в list
-        - преобразовывает 0 столбец из pandas в datetime.datetime
+    Строки до последней записи в таблице уже отброшены при чтении в iter_tables_from_txt
 
     :arg table1 - таблица из table_from_txt в формате pandas.DataFrame
-    :arg last_date1 - дата и время последней записи из таблицы
     """
-    table1[0], table1[6] = table1[0].map(lambda x: x.strip()), table1[6].map(lambda x: x.strip())  # удаляем пробелы по бокам
-    table1[0], table1[6] = table1[0].map(lambda x: re.findall(r'\d', x)), table1[6].map(lambda x: re.findall(r'\d', x))  # позвращаем список только с цифрами
-    table1[0] = table1[0] + table1[6]
+    table1[0] = vp_datetime(table1[0], table1[6])  # дата и время в один столбец datetime64
     del table1[6]
-    table1[0] = table1[0].map(lambda x: ''.join(x))  # соединяем цифры в стиле "01122018010947"
-    table1[0] = table1[0].map(lambda x: dt.datetime(
-        year=int(x[4:8]), month=int(x[2:4]), day=int(x[0:2]),
-        hour=int(x[8:10]), minute=int(x[10:12]), second=int(x[12:])
-    ))
-    table1 = table1[table1[0] > last_date1]
     table1 = table1.sort_values(by=0)
-    table1 = to_datetime_in_list(table1.values, 0)
     return table1
 
 
-def reshape_table_for_vp_184(table1, last_date1) -> pd.DataFrame:
+def reshape_table_for_vp_184(table1) -> pd.DataFrame:
     """
     Преобразование таблицы из функции table_from_txt() для загрузки в базу ТОЛЬКО по 184 линии
         - объединяет столбцы 0 и 5 в один столбец 0 с форматом datetime (автоматом в timestamp переводится)
         - 5 столбец удаляется
-        - выбираются данные после последней записи в таблице
-        - преобразовывает из pandas.DataFrame в list
-        - преобразовывает 0 столбец из pandas в datetime.datetime
+    Строки до последней записи в таблице уже отброшены при чтении в iter_tables_from_txt
 
     :arg table1 - таблица из table_from_txt в формате pandas.DataFrame
-    :arg last_date1 - дата и время последней записи из таблицы
     """
-    table1[0], table1[5] = table1[0].map(lambda x: x.strip()), table1[5].map(lambda x: x.strip())  # удаляем пробелы по бокам
-    table1[0], table1[5] = table1[0].map(lambda x: re.findall(r'\d', x)), table1[5].map(lambda x: re.findall(r'\d', x))  # позвращаем список только с цифрами
-    table1[5] = table1[5].map(lambda x: ['0'] + x if len(x) != 6 else x)  # на станке 184 время выгружается как 9:10:10 вместо 09:10:10
-    table1[0] = table1[0] + table1[5]
+    table1[0] = vp_datetime(table1[0], table1[5])  # на станке 184 время выгружается как 9:10:10 вместо 09:10:10
     del table1[5], table1[9]
-    table1[0] = table1[0].map(lambda x: ''.join(x))  # соединяем цифры в стиле "01122018010947"
-    table1[0] = table1[0].map(lambda x: dt.datetime(
-        year=int(x[4:8]), month=int(x[2:4]), day=int(x[0:2]),
-        hour=int(x[8:10]), minute=int(x[10:12]), second=int(x[12:])
-    ))
-    table1 = table1[table1[0] > last_date1]
     table1 = table1.sort_values(by=0)
-    table1 = to_datetime_in_list(table1.values, 0)
     return table1
 
 
+def vp_datetime(date1, time1) -> pd.Series:
+    """
+    Собирает столбец datetime из столбцов даты и времени txt файла vp линии без построчных преобразований.
+    Дат в выгрузке единицы, а времени не больше 86400 вариантов, поэтому разбираются только уникальные значения:
+    из них удаляются все символы кроме цифр, время дополняется нулем слева до 6 цифр (на станке 184 время
+    выгружается как 9:10:10 вместо 09:10:10) и переводится через pd.to_datetime с явным форматом
+
+    :arg date1 - pd.Series с датами like ' 01.12.2018 '
+    :arg time1 - pd.Series с временем like ' 01:09:47 ' или ' 9:10:10 '
+    :return pd.Series в формате datetime64
+    """
+    date_codes, dates = pd.factorize(date1.astype(str))
+    time_codes, times = pd.factorize(time1.astype(str))
+    dates = pd.to_datetime(dates.str.replace(r'\D', '', regex=True), format='%d%m%Y')
+    times = pd.to_datetime(
+        times.str.replace(r'\D', '', regex=True).str.zfill(6), format='%H%M%S'
+    ) - dt.datetime(year=1900, month=1, day=1)  # время как смещение от начала дня
+    return pd.Series(dates.values[date_codes] + times.values[time_codes], index=date1.index)
+
+
 def load_list_files_vp(name_table1) -> pd.DataFrame:
     """
     Создает таблицу файлов линий вп из папки.
@@ -184,3 +314,121 @@ def load_list_files_vp(name_table1) -> pd.DataFrame:
     files['date'] = files.path.map(parse_date_path)
     files = files.sort_values(by=['date'])
     return files
+
+
+def inbase_vp_files(cur1, name_table1) -> pd.DataFrame:
+    """
+    Возвращает из таблицы vp_files (путь, размер, время изменения и смещение в байтах, до которого файл уже
+    загружен) файлы станка. Создает таблицу, если ее не существует
+
+    :arg cur1 - объект sqlite3.connection.cursor
+    :arg name_table1 - наименование таблицы либо 'vp_164','vp_184', либо 'vpx_94'
+    :return pd.DataFrame с колонками 'path', 'size_db', 'mtime_db', 'byte_offset'
+    """
+    cur1.execute("""CREATE TABLE IF NOT EXISTS vp_files(
+                    id INTEGER PRIMARY KEY,
+                    name_table TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    byte_offset INTEGER NOT NULL)""")
+    cur1.execute("""CREATE UNIQUE INDEX IF NOT EXISTS vp_files_path on vp_files(path)""")
+    cur1.execute("""SELECT path, size, mtime, byte_offset FROM vp_files WHERE name_table = ?""", (name_table1,))
+    return pd.DataFrame(data=cur1.fetchall(), columns=['path', 'size_db', 'mtime_db', 'byte_offset'])
+
+
+def vp_files_to_read(table_files1, inbase_files1, now1=None) -> pd.DataFrame:
+    """
+    Сверяет файлы vp линии с таблицей vp_files и возвращает только те файлы, которые нужно читать,
+    с границами чтения:
+        - файлы без изменений (размер и время изменения как в vp_files) отбрасываются
+        - дописанные файлы читаются с сохраненного смещения
+        - новые и перезаписанные (уменьшившиеся) файлы читаются с начала
+    Конец чтения - последний перевод строки, недописанная строка будет прочитана при следующей загрузке.
+    Законченные файлы (за прошлые дни или не менявшиеся FINISHED_FILE_SECONDS) читаются до конца,
+    последняя строка без перевода строки тоже загружается
+
+    :arg table_files1 - таблица из load_list_files_vp с колонками 'path', 'date'
+    :arg inbase_files1 - таблица из inbase_vp_files
+    :arg now1 - dt.datetime текущее время, None - dt.datetime.now()
+    :return pd.DataFrame с колонками 'path', 'date', 'size', 'mtime', 'start_offset', 'end_offset',
+    'tracked' (True - файл есть в vp_files и читается с сохраненного смещения)
+    """
+    now1 = dt.datetime.now() if now1 is None else now1
+    table_files1 = table_files1.copy()
+    stats = [os.stat(i) for i in table_files1.path.values]
+    table_files1['size'] = [i.st_size for i in stats]
+    table_files1['mtime'] = [i.st_mtime for i in stats]
+    table_files1 = table_files1.merge(inbase_files1, on='path', how='left')
+
+    finished = (table_files1['date'] < zero_time_dt(now1)) | \
+        (table_files1['mtime'] < now1.timestamp() - FINISHED_FILE_SECONDS)
+    unchanged = (table_files1['size'] == table_files1['size_db']) & \
+        (table_files1['mtime'] == table_files1['mtime_db']) & \
+        ~(finished & (table_files1['byte_offset'] < table_files1['size']))  # у законченного файла остался хвост
+    table_files1 = table_files1[~unchanged]
+    finished = finished[~unchanged]
+    table_files1['start_offset'] = table_files1['byte_offset'].\
+        where(table_files1['byte_offset'] <= table_files1['size'], 0).\
+        fillna(0).\
+        astype(int)  # новые и перезаписанные файлы читаются с начала
+    table_files1['tracked'] = table_files1['byte_offset'].notna() & \
+        (table_files1['start_offset'] == table_files1['byte_offset'])  # чтение продолжается с сохраненного смещения
+    table_files1['end_offset'] = [
+        i.size if done else last_line_offset(i.path, i.start_offset, i.size)
+        for i, done in zip(table_files1.itertuples(), finished)
+    ]
+    return table_files1[['path', 'date', 'size', 'mtime', 'start_offset', 'end_offset', 'tracked']]
+
+
+def last_line_offset(path1, start1, size1, block1=65536) -> int:
+    """
+    Возвращает смещение в байтах сразу после последнего перевода строки в файле между start1 и size1.
+    Если полных строк после start1 нет, возвращает start1
+
+    :arg path1 - путь к txt файлу
+    :arg start1 - смещение, с которого начинается чтение
+    :arg size1 - размер файла на момент сверки
+    :arg block1 - размер блока, которыми файл читается с конца
+    """
+    with open(path1, 'rb') as f:
+        end = size1
+        while end > start1:
+            begin = max(start1, end - block1)
+            f.seek(begin)
+            pos = f.read(end - begin).rfind(b'\n')
+            if pos != -1:
+                return begin + pos + 1
+            end = begin
+    return start1
+
+
+def read_vp_part(path1, start1, end1) -> io.BytesIO:
+    """
+    Читает часть txt файла vp линии между смещениями start1 и end1 (в байтах)
+
+    :arg path1 - путь к txt файлу
+    :arg start1 - смещение начала чтения
+    :arg end1 - смещение конца чтения из last_line_offset
+    :return io.BytesIO для pd.read_csv
+    """
+    with open(path1, 'rb') as f:
+        f.seek(start1)
+        return io.BytesIO(f.read(end1 - start1))
+
+
+def update_vp_files(cur1, name_table1, table_files1) -> None:
+    """
+    Записывает в таблицу vp_files размер, время изменения и смещение, до которого загружены файлы !без commit!
+
+    :arg cur1 - объект sqlite3.connection.cursor
+    :arg name_table1 - наименование таблицы либо 'vp_164','vp_184', либо 'vpx_94'
+    :arg table_files1 - таблица из vp_files_to_read
+    """
+    rows = [
+        (name_table1, i.path, int(i.size), float(i.mtime), int(i.end_offset)) for i in table_files1.itertuples()
+    ]
+    cur1.executemany(
+        """INSERT OR REPLACE INTO vp_files(name_table,path,size,mtime,byte_offset) VALUES (?,?,?,?,?)""",
+        rows
+    )
@@ -1,18 +1,18 @@
 """Preparation plazma report"""
 
 import datetime as dt
-import os
-import re
-import os.path
 import shutil
+import pandas as pd
 
 from common.excel import (
-    load_table_in_xlsheet, run_macro, convert_xltime
+    write_xlsheets, convert_xltime
 )
 from common.common import (
-    zero_time_dt, true_date, def_smena, date_range
+    zero_time_dt, true_dates, def_smenas, date_grid, plazma_path_numbers
 )
-from common.database import load_data_from_db
+from common.database import (load_data_from_db, load_shift_stats, report_fingerprint)
+
+C_ST = 0.18  # coefficient setup time (коэффициент подготовительно-заключительного времени
 
 
 def prep_plaz_xlfile() -> None:
@@ -20,25 +20,51 @@ def prep_plaz_xlfile() -> None:
     Подгаталивает файл эксель (загружает нужные данные на технические листы), выполняет макрос в файле и копирует
     готовый файл в папку с отчетами по плазме.
     """
+    write_plaz_xlfile(prep_plaz_tables())
+
+
+def prep_plaz_tables() -> dict:
+    """
+    Подготовка данных отчета без эксель, выполняется в отдельном процессе run_reports
+
+    :return: dict {наименование листа: pd.DataFrame} для write_plaz_xlfile
+    """
     detail_table = prep_detail_plazdata()
-    gen_table = prep_gen_plazdata(detail_table)
+    gen_table = prep_gen_plazdata()
     plot_table = prep_plot_plazdata(gen_table)
+    return {'1': detail_table, '2': gen_table, '3': plot_table}
 
-    PATH_FILE = r".\common\files\plazma.xlsm"
-    load_table_in_xlsheet(detail_table, '1', PATH_FILE)
-    load_table_in_xlsheet(gen_table, '2', PATH_FILE)
-    load_table_in_xlsheet(plot_table, '3', PATH_FILE)
 
-    run_macro(PATH_FILE, 'plazma_format')
+def write_plaz_xlfile(tables1: dict) -> None:
+    """
+    Загружает таблицы prep_plaz_tables на технические листы, выполняет макрос в файле и копирует
+    готовый файл в папку с отчетами по плазме
+
+    :arg tables1: dict {наименование листа: pd.DataFrame} из prep_plaz_tables
+    """
+    gen_table = tables1['2']
+
+    PATH_FILE = r".\common\files\plazma.xlsm"
+    write_xlsheets(tables1, PATH_FILE, macro1='plazma_format')
 
     min_date = gen_table.date.min().strftime("%y%m%d")
     max_date = gen_table.date.max().strftime("%y%m%d")
     cur_date = dt.datetime.now().date().strftime("%y%m%d")
-    name_copy_f = f"{cur_date}_Отчёт_по_Плазме_за_период_{min_date}-{max_date}.xlsm"
-    copy_path = r"W:\1.1. Отчеты по производству\1.1.3 Отчёт по Плазме" + "\\" + name_copy_f
+    name_copy_f = f"{cur_date}_Отчёт_по_Плазме_за_период_{min_date}-{max_date}.xlsm"
+    copy_path = r"W:\1.1. Отчеты по производству\1.1.3 Отчёт по Плазме" + "\\" + name_copy_f
     shutil.copy(PATH_FILE, copy_path)
 
 
+def plaz_fingerprint() -> tuple:
+    """
+    Отпечаток входных данных отчета по плазме за то же окно, что и в prep_detail_plazdata
+
+    :return: tuple из report_fingerprint
+    """
+    start_date = zero_time_dt(dt.datetime.now()) - dt.timedelta(days=46)
+    return report_fingerprint('plazma', start_date)
+
+
 def prep_detail_plazdata():
     """
     Подгатавливает детализированную таблицу данных по ПЛАЗМЕ.
@@ -49,10 +75,10 @@ def prep_detail_plazdata():
     """
     cols_names = [
         'path', 'dt_change', 'path_in', 'mass', 'cut_amount', 'stub_amount', 'cut_time',
-        'move_time', 'stub_time', 'cut_length', 'move_length', 'umc', 'size_thickness'
+        'move_time', 'stub_time', 'cut_length', 'move_length', 'umc', 'size_thickness',
+        'n_task', 'n_card', 'operator'
     ]                                                                 # колонки для sql query
     cur_date = dt.datetime.now()  # ткущая дата для расчета периода
-    c_st = 0.18  # coefficient setup time (коэффициент подготовительно-заключительного времени
     cols_with_time = [
         'cut_time', 'move_time', 'stub_time', 'machine_time', 'setup_time', 'all_time'
     ]  # колонки с временными данными
@@ -63,15 +89,19 @@ def prep_detail_plazdata():
     table = load_data_from_db('plazma_cards', cols_names,
                               date_col='dt_change', start_date=start_date, end_date=end_date)
     # начало преобразований в таблице +++++++++++++++++++++++++
-    table['date'] = table['dt_change'].map(true_date)
-    table['smena'] = table['dt_change'].map(def_smena)
-    table['n_task'] = table['path_in'].map(num_task)
-    table['n_card'] = table['path_in'].map(num_card)
+    table['date'] = true_dates(table['dt_change'])
+    table['smena'] = def_smenas(table['dt_change'])
+    numbers = table[['n_task', 'n_card', 'operator']].astype('Int64')
+    not_parsed = numbers['n_task'].isna()  # карты, загруженные до появления номеров в plazma_cards
+    if not_parsed.any():
+        numbers.loc[not_parsed] = plazma_path_numbers(table.loc[not_parsed, 'path_in'], table.loc[not_parsed, 'path'])
+    table['n_task'] = numbers['n_task'].astype('int64')
+    table['n_card'] = numbers['n_card'].astype('int64')
+    table['operator'] = numbers['operator'].astype('float64')  # номер не найден - NaN, как пустая ячейка в эксель
     table['machine_time'] = table['cut_time'] + table['move_time'] + table['stub_time']
-    table['setup_time'] = table['machine_time'] * c_st
+    table['setup_time'] = table['machine_time'] * C_ST
     table['all_time'] = table['machine_time'] + table['setup_time']
     table = convert_xltime(table, cols_with_time)  # преобразование времени к экселевскому формату в нужных колонках (секунды / (24*60*60))
-    table['operator'] = table['path'].map(num_oper)
     table = table[['date', 'smena', 'n_task', 'n_card', 'size_thickness', 'umc', 'mass', 'cut_amount', 'stub_amount',
                    'cut_length', 'move_length', 'cut_time', 'move_time', 'stub_time', 'machine_time', 'setup_time',
                    'all_time', 'operator']]  # правильный порядок столбцов
@@ -80,31 +110,30 @@ def prep_detail_plazdata():
     return table
 
 
-def prep_gen_plazdata(table1):
+def prep_gen_plazdata():
     """
-    Преобразует table1 в таблице сгруппированную по дням и сменам с нужными коэфициентами и др
+    Готовит таблицу по дням и сменам с нужными коэфициентами и др из итогов по сменам shift_stats,
+    которые пересчитываются при загрузке карт (load_plazma_tables)
 
-    :param table1: pd.DataFrame таблица из фу-ии prepare_plazma_detail
     :return: pd.DataFrame для загрузки на лист с общими данными (по дням и сманам)
     """
     c_kpd = ((10.75 * 60 * 60) / (24 * 60 * 60))  # делитель для расчета кпд оператора (10.75 часов - это 10-45)
     c_kio = ((12 * 60 * 60) / (24 * 60 * 60))  # делитель для расчета кио
+    cur_date = dt.datetime.now().date()
 
-    cols_fst = ['date', 'smena', 'all_time', 'machine_time', 'weight_umc']  # cols for sum_table
-    mass_table = table1[['date', 'smena', 'mass']].groupby(by=['date', 'smena']).sum().reset_index()
-    table1 = table1.merge(mass_table[['date', 'smena', 'mass']], on=['date', 'smena'])
-    table1['weight_umc'] = (table1['mass_x'] / table1['mass_y']) * table1['umc']
-
-    gen_table = table1[cols_fst].groupby(by=['date', 'smena']).sum().reset_index()
-    gen_table['all_time'] = gen_table['all_time'] / c_kpd  # кпд оператора
+    gen_table = load_shift_stats('plazma', cur_date - dt.timedelta(days=46), cur_date).fillna(0)
+    gen_table['machine_time'] = gen_table['oper_seconds'] / (24 * 60 * 60)  # время в экселевском формате
+    gen_table['all_time'] = (gen_table['machine_time'] * (1 + C_ST)) / c_kpd  # кпд оператора
     gen_table['kio'] = gen_table['machine_time'] / c_kio  # кио
-
-    count_table = table1[['date', 'smena', 'n_task']].groupby(by=['date', 'smena']).count().reset_index()
-    gen_table = gen_table.merge(count_table, on=['date', 'smena'])
+    gen_table['n_task'] = gen_table['cards']
+    gen_table['weight_umc'] = (gen_table['umc_mass'] / gen_table['mass']).fillna(0)  # umc взвешенный по массе
     gen_table = gen_table[['date', 'smena', 'all_time', 'kio', 'n_task', 'weight_umc', 'machine_time']]
 
-    done_table = date_range(gen_table.date)  # добавляет нули, если смена пропущена
-    gen_table = done_table.merge(gen_table, how='outer', on=['date', 'smena']).replace({None: 0})
+    gen_table['date'] = pd.to_datetime(gen_table['date'])
+    gen_table = gen_table.set_index(['date', 'smena'])
+    gen_table = gen_table.\
+        reindex(date_grid(gen_table.index.get_level_values('date')).union(gen_table.index), fill_value=0).\
+        reset_index()  # добавляет нули, если смена пропущена, сегодняшние смены остаются только с данными
     gen_table = gen_table.sort_values(by=['date', 'smena'], ascending=False)  # сортировка от большего к меньшему
     return gen_table
 
@@ -121,46 +150,3 @@ def prep_plot_plazdata(table1):
     table1 = table1.sort_values(by=['date'], ascending=False)
     return table1
 
-
-def num_task(path1):
-    """
-    Парсит путь к файлу и ворачивает номер задания
-
-    :param path1: str полный путь к файлу из ячейки самого файла
-    :return: int номер задания
-    """
-    n_task = os.path.basename(path1)
-    n_task = re.search(r"ССЗ\s*№\s*(\d+)", n_task)
-    if n_task is None:
-        return 0
-    else:
-        return int(n_task.group(1))
-
-
-def num_card(path1):
-    """
-    Парсит путь к файлу и ворачивает номер карты
-
-    :param path1: str полный путь к файлу из ячейки самого файла
-    :return: int номер карты
-    """
-    n_card = os.path.basename(path1)
-    n_card = re.search(r"карта\s*№\s*(\d+)", n_card)
-    if n_card is None:
-        return 0
-    else:
-        return int(n_card.group(1))
-
-
-def num_oper(path1):
-    """
-    Парсит путь к файлу и ворачивает номер оператора
-
-    :param path1: str полный путь к файлу
-    :return: int номер оператора
-    """
-    n_oper = re.search(r'\\(\d)\\', path1)
-    if n_oper is None:
-        return None
-    else:
-        return int(n_oper.group(1))
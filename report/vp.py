@@ -5,12 +5,12 @@ import shutil
 import pandas as pd
 
 from common.excel import (
-    load_table_in_xlsheet, run_macro, convert_xltime,
+    write_xlsheets, convert_xltime,
 )
 from common.common import (
-    zero_time_dt, true_date, def_smena, date_range
+    zero_time_dt, true_dates, def_smenas, date_grid
 )
-from common.database import load_data_from_db
+from common.database import (load_data_from_db, load_shift_stats, report_fingerprint)
 
 
 def prep_vp_xlfile(vpname1: str) -> None:
@@ -20,29 +20,57 @@ def prep_vp_xlfile(vpname1: str) -> None:
 
     :arg vpname1: str наименование vp линии в формате 'vp-94'
     """
-    folder_path = {'vpx_94': '1.1.2 Отчёт по VPX 94',
-                   'vp_164': '1.1.1 Отчёт по VP 164',
-                   'vp_184': '1.1.7 Отчёт по VP 184'}
+    write_vp_xlfile(vpname1, prep_vp_tables(vpname1))
+
+
+def prep_vp_tables(vpname1: str) -> dict:
+    """
+    Подготовка данных отчета без эксель, выполняется в отдельном процессе run_reports
+
+    :param vpname1: str наименование vp линии в формате 'vp_94'
+    :return: dict {наименование листа: pd.DataFrame} для write_vp_xlfile
+    """
     detail_table = prep_detail_vptable(vpname1)
-    gen_table = prep_gen_vptable(detail_table)
+    gen_table = prep_gen_vptable(vpname1)
     kio_table, kpd_table = prep_plot_vpdata(gen_table)
+    return {'1': detail_table, '2': gen_table, '3': kio_table, '4': kpd_table}
 
-    path_file = r".\common\files\{0}.xlsm".format(vpname1)
-    load_table_in_xlsheet(detail_table, '1', path_file)
-    load_table_in_xlsheet(gen_table, '2', path_file)
-    load_table_in_xlsheet(kio_table, '3', path_file)
-    load_table_in_xlsheet(kpd_table, '4', path_file)
 
-    run_macro(path_file, 'vp_format')
+def write_vp_xlfile(vpname1: str, tables1: dict) -> None:
+    """
+    Загружает таблицы prep_vp_tables на технические листы, выполняет макрос в файле и копирует
+    готовый файл в папку с отчетами
+
+    :arg vpname1: str наименование vp линии в формате 'vp_94'
+    :arg tables1: dict {наименование листа: pd.DataFrame} из prep_vp_tables
+    """
+    folder_path = {'vpx_94': '1.1.2 Отчёт по VPX 94',
+                   'vp_164': '1.1.1 Отчёт по VP 164',
+                   'vp_184': '1.1.7 Отчёт по VP 184'}
+    gen_table = tables1['2']
+
+    path_file = r".\common\files\{0}.xlsm".format(vpname1)
+    write_xlsheets(tables1, path_file, macro1='vp_format')
 
     min_date = gen_table.date.min().strftime("%y%m%d")
     max_date = gen_table.date.max().strftime("%y%m%d")
     cur_date = dt.datetime.now().date().strftime("%y%m%d")
-    name_copy_f = f"{cur_date}_Отчёт_по_{vpname1}_за_период_{min_date}-{max_date}.xlsm"
+    name_copy_f = f"{cur_date}_Отчёт_по_{vpname1}_за_период_{min_date}-{max_date}.xlsm"
     copy_path = r"W:\1.1. Отчеты по производству\{0}".format(folder_path[vpname1]) + "\\" + name_copy_f
     shutil.copy(path_file, copy_path)
 
 
+def vp_fingerprint(vpname1: str) -> tuple:
+    """
+    Отпечаток входных данных отчета по vp линии за то же окно, что и в prep_detail_vptable
+
+    :param vpname1: str наименование vp линии в формате 'vp_94'
+    :return: tuple из report_fingerprint
+    """
+    start_date = zero_time_dt(dt.datetime.now()) - dt.timedelta(days=46)
+    return report_fingerprint(vpname1, start_date)
+
+
 def prep_detail_vptable(vpname1: str):
     """
     Подготовка таблицы с детализированной информацией по vp линии
@@ -60,22 +88,22 @@ def prep_detail_vptable(vpname1: str):
         'c_0': 'datetime', 'c_4': 'nomenclature', 'c_3': 'marka',
         'c_9': 'mass', 'c_7': 'dur_oper', 'c_17': 'ind_plet'
     })
-    table['dur_oper'] = table['dur_oper'].map(lambda x: 0 if x > 10 * 60 else x)  # продолжительность операции ограничивается 30 минутами, 23.09.2020 было решено на совещании
+    table['dur_oper'] = table['dur_oper'].mask(table['dur_oper'] > 10 * 60, 0)  # продолжительность операции ограничивается 30 минутами, 23.09.2020 было решено на совещании
     # table = table[table['dur_oper'] <= 10*60]
-    table['date'] = table['datetime'].map(true_date)
-    table['smena'] = table['datetime'].map(def_smena)
+    table['date'] = true_dates(table['datetime'])
+    table['smena'] = def_smenas(table['datetime'])
 
     if vpname1 == 'vp_184':
         table['ind_plet'] = 0
         # на новой ВП линии указано время начала
         table['start_oper'] = table['datetime']
-        table['end_oper'] = (table['datetime'] + table['dur_oper'].map(lambda x: dt.timedelta(seconds=x)))
+        table['end_oper'] = table['datetime'] + pd.to_timedelta(table['dur_oper'], unit='s')
 
     else:
         table['ind_plet'] = table['ind_plet'].replace({2: 1, 1: 0})
         # на старых ВП линиях указано время окончания
         table['end_oper'] = table['datetime']
-        table['start_oper'] = (table['datetime'] - table['dur_oper'].map(lambda x: dt.timedelta(seconds=x)))
+        table['start_oper'] = table['datetime'] - pd.to_timedelta(table['dur_oper'], unit='s')
 
     table = convert_xltime(table, ['dur_oper'])
 
@@ -89,42 +117,18 @@ def prep_detail_vptable(vpname1: str):
             'dur_oper', 'ind_plet'
         ]]
     else:
-        # определение начала плети и конца
-        table['ind_plet_2'] = table['ind_plet'].copy().shift(periods=-1)  # сдвиг индикатора вверх на 1, что бы легче определить начало и конец
-        table['ind_plet_2'].iloc[-1] = 1  # заполнение последнего значения, что бы было 1
-
-        table['start_plet'] = table['start_oper'].\
-            where(table['ind_plet'] == 1, None).\
-            fillna(method='ffill')
-        table['start_plet'].iloc[0] = table['start_oper'].iloc[0]
-
-        table['end_plet'] = table['end_oper'].\
-            where(table['ind_plet_2'] == 1, None).\
-            fillna(method='bfill')
-        table['end_plet'].iloc[-1] = table['end_oper'].iloc[-1]
-
-        # создание уникального номера плети
-        table['number_plet'] = table['ind_plet'].replace({0: None})
-        table = table.reset_index()
-        table['number_plet'] = table['number_plet'] + table.index
-
-        for_merge_table = table.copy()  # таблица с неповторяющимися номерами плетей
-        table['number_plet'] = table['number_plet'].fillna(method='ffill')
-        table = table[~(table['number_plet'].isna())]
-
-        # копированная таблица для группировки
-        group_table = table.copy().\
-            groupby(by=['number_plet'])['mass', 'dur_oper'].\
-            sum().\
-            reset_index()
+        # номер плети - кол-во начал плетей до операции включительно, операции до первого начала плети отбрасываются
+        starts = table['ind_plet'] == 1
+        number_plet = starts.cumsum()
+        sum_table = table.groupby(number_plet).agg(
+            mass=('mass', 'sum'), dur_oper=('dur_oper', 'sum'), end_oper=('end_oper', 'last')
+        )
 
         # тут старт операции и конец операции это уже старт и конец ПЛЕТИ
-        group_table = group_table.merge(
-            for_merge_table[['date', 'nomenclature', 'smena', 'start_plet', 'end_plet', 'number_plet', 'ind_plet']],
-            on='number_plet',
-            how='left'
-        ).rename(columns={'start_plet': 'start_oper', 'end_plet': 'end_oper'})
-        table = group_table
+        table = table.loc[starts, ['date', 'nomenclature', 'smena', 'start_oper', 'ind_plet']].\
+            set_index(number_plet[starts]).\
+            join(sum_table).\
+            reset_index(drop=True)
 
         table = table[[
             'date', 'smena', 'nomenclature',
@@ -137,29 +141,31 @@ def prep_detail_vptable(vpname1: str):
     return table
 
 
-def prep_gen_vptable(table1):
+def prep_gen_vptable(vpname1: str):
     """
-    Преобразовывает таблицу из prep_detail_vptable в виде сводной таблицы для файла ексель
+    Готовит сводную таблицу по дням и сменам для файла ексель из итогов по сменам shift_stats,
+    которые пересчитываются при загрузке данных (load_vp)
 
-    :param table1: pd.DataFrame таблица из prep_detail_vptable
+    :param vpname1: str наименование таблицы в виде 'vp_94'
     :return: pd.DataFrame
     """
-    cols_sum_table = ['date', 'smena', 'mass', 'dur_oper', 'ind_plet']
-    time_for_plet = 73 / (24*60*60)  # время в экселевском формате
+    time_for_plet = 73  # время на плеть в секундах
     c_kpd = ((10.75 * 60 * 60) / (24 * 60 * 60))  # делитель для расчета кпд оператора (10.75 часов - это 10-45)
     c_kio = ((12 * 60 * 60) / (24 * 60 * 60))  # делитель для расчета кио
-    sum_table = table1[cols_sum_table].\
-        fillna(0).\
-        groupby(by=['date', 'smena']).\
-        sum().\
-        reset_index()
-    sum_table['dur_oper'] = sum_table['dur_oper'] + (sum_table['ind_plet'] * time_for_plet)  # ко времени выполнения операций прибавляется время на плеть (time_for_plet)
+    cur_date = dt.datetime.now().date()
+    sum_table = load_shift_stats(vpname1, cur_date - dt.timedelta(days=46), cur_date).fillna(0)
+    sum_table['dur_oper'] = (
+            (sum_table['oper_seconds'] + sum_table['plets'] * time_for_plet) / (24*60*60)
+    )  # ко времени выполнения операций прибавляется время на плеть (time_for_plet), время в экселевском формате
     sum_table['kio'] = sum_table['dur_oper'] / c_kio
     sum_table['kpd'] = (sum_table['dur_oper'] * 1.21) / c_kpd
     sum_table = sum_table[['date', 'smena', 'kio', 'kpd', 'dur_oper', 'mass']]
 
-    done_table = date_range(sum_table.date)  # для добавления нулей, если смена пропущена
-    gen_table = done_table.merge(sum_table, how='outer', on=['date', 'smena']).replace({None: 0})
+    sum_table['date'] = pd.to_datetime(sum_table['date'])
+    sum_table = sum_table.set_index(['date', 'smena'])
+    gen_table = sum_table.\
+        reindex(date_grid(sum_table.index.get_level_values('date')).union(sum_table.index), fill_value=0).\
+        reset_index()  # для добавления нулей, если смена пропущена, сегодняшние смены остаются только с данными
     gen_table = gen_table.sort_values(by=['date', 'smena'], ascending=False)  # сортировка от большего к меньшему
     return gen_table
 
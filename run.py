@@ -5,17 +5,20 @@ Execution script with windows planner
 
 import datetime as dt
 import os
+import sys
 
-from common.common import check_func
-from common.database import check_data_in_db
+from functools import partial
+from common.common import log_message
+from common.database import check_data_in_db, connection_stats
+from common.scheduler import Stage, Report, run_stages, run_reports
 from etl.nomenclature import load_nomenclature
 from etl.inputs import load_inputs
 from etl.clients import load_clients
-from etl.vp import load_vp
+from etl.vp import load_vp_parallel
 from etl.plazma import load_plazma_tables
 from etl.voortman import prepare_voortman_data
-from report.plazma import prep_plaz_xlfile
-from report.vp import prep_vp_xlfile
+from report.plazma import prep_plaz_tables, write_plaz_xlfile, plaz_fingerprint
+from report.vp import prep_vp_tables, write_vp_xlfile, vp_fingerprint
 from report.voortman import voortman_report
 
 
@@ -26,25 +29,36 @@ if __name__ == '__main__':
     VP_184 = 'VP_184'
     VPX_94 = 'VPX_94'
     PATH_PLAZMA = r'W:\Plasma\REPORT\{0}'.format(CUR_YEAR)
+    MAX_WORKERS = 4  # кол-во одновременно выполняемых этапов и процессов подготовки отчетов
+    FORCE_REPORTS = '--force' in sys.argv  # строить отчеты, даже если данные не изменились
+    FULL_SCAN = True if '--full-scan' in sys.argv else None  # все папки карт плазмы, None - раз в день
 
-    """Блок с ETL можно сделать в мультипроцессе ТОЧНО!"""
-    check_func(load_nomenclature)
-    check_func(load_inputs)
-    check_func(load_clients)
-    check_func(load_vp, (VP_164,))
-    check_func(load_vp, (VP_184,))
-    check_func(load_vp, (VPX_94,))
-    check_func(load_plazma_tables, (PATH_PLAZMA,))
-    check_func(prepare_voortman_data)
+    """
+    Этапы ETL независимы, но в bd_oemz на SMB (без WAL) пишет только один этап за раз (lock='bd_oemz'),
+    одновременно с ними выполняются только этапы, которые не пишут в bd_oemz
+    """
+    stages = [
+        Stage('load_nomenclature', load_nomenclature, lock='bd_oemz'),
+        Stage('load_inputs', load_inputs, lock='bd_oemz'),
+        Stage('load_clients', load_clients, lock='bd_oemz'),
+        Stage('load_vp', load_vp_parallel, ((VP_164, VP_184, VPX_94),),
+              lock='bd_oemz'),  # линии читаются параллельно, пишет в базу один процесс
+        Stage('load_plazma_tables', load_plazma_tables, (PATH_PLAZMA, FULL_SCAN), lock='bd_oemz'),
+        Stage('prepare_voortman_data', prepare_voortman_data),  # база pobeda и csv файлы
+    ]
+    statuses = run_stages(stages, max_workers1=MAX_WORKERS)
 
-    """Блок с REP можно сделать в мультипроцессе ВОЗМОЖНО(нужно проверить работу с ексель)!"""
-    if check_data_in_db('plazma'):
-        check_func(prep_plaz_xlfile)
-    check_func(voortman_report)
-
-    if check_data_in_db('vp_164'):
-        check_func(prep_vp_xlfile, ('vp_164',))
-    if check_data_in_db('vp_184'):
-        check_func(prep_vp_xlfile, ('vp_184',))
-    if check_data_in_db('vpx_94'):
-        check_func(prep_vp_xlfile, ('vpx_94',))
+    """Данные отчетов готовятся одновременно в отдельных процессах, в ексель отчеты пишутся по очереди"""
+    reports = [
+        Report('prep_plaz_xlfile', write_plaz_xlfile, prep_plaz_tables, deps=('load_plazma_tables',),
+               condition=partial(check_data_in_db, 'plazma'), fingerprint=plaz_fingerprint),
+        Report('voortman_report', voortman_report, deps=('prepare_voortman_data',)),
+        Report('prep_vp_xlfile_164', write_vp_xlfile, prep_vp_tables, ('vp_164',), deps=('load_vp',),
+               condition=partial(check_data_in_db, 'vp_164'), fingerprint=vp_fingerprint),
+        Report('prep_vp_xlfile_184', write_vp_xlfile, prep_vp_tables, ('vp_184',), deps=('load_vp',),
+               condition=partial(check_data_in_db, 'vp_184'), fingerprint=vp_fingerprint),
+        Report('prep_vp_xlfile_94', write_vp_xlfile, prep_vp_tables, ('vpx_94',), deps=('load_vp',),
+               condition=partial(check_data_in_db, 'vpx_94'), fingerprint=vp_fingerprint),
+    ]
+    run_reports(reports, statuses, max_workers1=MAX_WORKERS, force1=FORCE_REPORTS)
+    log_message(f"bd_oemz connections: {connection_stats()}")
@@ -0,0 +1,22 @@
+"""Common fixtures of the tests"""
+
+import pytest
+
+from common import database
+
+
+@pytest.fixture(autouse=True)
+def log_dir(tmp_path, monkeypatch):
+    """log_message пишет в ".\\LOG_LOAD_DB.log" текущей папки, тесты выполняются в tmp_path, а не в репозитории"""
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.fixture(autouse=True)
+def bd_oemz(tmp_path, monkeypatch):
+    """Отдельная база bd_oemz.bd3 для каждого теста, соединения текущего потока закрываются после теста"""
+    monkeypatch.setattr(database, 'PATH_BD_OEMZ', str(tmp_path / 'bd_oemz.bd3'))
+    database.CONNECTIONS.conns = dict()
+    yield
+    for _, conn in database.CONNECTIONS.conns.values():
+        conn.close()
+    database.CONNECTIONS.conns = dict()
@@ -0,0 +1,73 @@
+"""Tests of common.scheduler"""
+
+import pytest
+
+from common import database, scheduler
+from common.error import XlMacroError
+from common.scheduler import Stage, Report, run_stages, run_reports
+
+FINGERPRINT = ('2020-01-01 00:00:00', 10, 10, '2020-01-01 12:00:00')
+WRITTEN = list()
+
+
+def prep_table(n1):
+    return [n1] * 3
+
+
+def write_table(n1, table1):
+    WRITTEN.append((n1, table1))
+
+
+def write_plain():
+    WRITTEN.append('plain')
+
+
+def write_broken_macro(*args):
+    raise XlMacroError('report.xlsm')
+
+
+def write_legacy_error(*args):
+    raise BaseException('macro error in an old helper')
+
+
+def fingerprint(*args):
+    return FINGERPRINT
+
+
+@pytest.fixture(autouse=True)
+def written(monkeypatch):
+    """Лог в никуда вместо файла и пустой список записанных отчетов"""
+    monkeypatch.setattr(scheduler, 'log_message', lambda message1: None)
+    WRITTEN.clear()
+
+
+def test_run_stages_contains_macro_error():
+    statuses = run_stages([
+        Stage('report', write_broken_macro),
+        Stage('after_report', write_plain, deps=('report',)),
+        Stage('other', write_plain),
+    ], max_workers1=2)
+    assert statuses == {'report': 'down', 'after_report': 'skipped', 'other': 'done'}
+    assert WRITTEN == ['plain']
+
+
+def test_run_reports_contains_macro_error():
+    statuses = run_reports([
+        Report('broken', write_broken_macro, prep_table, (1,), fingerprint=fingerprint),
+        Report('prepared', write_table, prep_table, (2,), fingerprint=fingerprint),
+        Report('legacy', write_legacy_error, fingerprint=fingerprint),
+        Report('plain', write_plain, fingerprint=fingerprint),
+    ], max_workers1=2)
+    assert statuses == {'broken': 'down', 'prepared': 'done', 'legacy': 'down', 'plain': 'done'}
+    assert sorted(WRITTEN, key=str) == sorted([(2, [2, 2, 2]), 'plain'], key=str)
+    assert database.read_report_fingerprint('broken') is None
+    assert database.read_report_fingerprint('prepared') == FINGERPRINT
+    assert database.read_report_fingerprint('plain') == FINGERPRINT
+
+
+def test_run_reports_skips_unchanged_input():
+    reports = [Report('prepared', write_table, prep_table, (2,), fingerprint=fingerprint)]
+    assert run_reports(reports, max_workers1=1) == {'prepared': 'done'}
+    assert run_reports(reports, max_workers1=1) == {'prepared': 'skipped'}
+    assert run_reports(reports, max_workers1=1, force1=True) == {'prepared': 'done'}
+    assert len(WRITTEN) == 2
@@ -0,0 +1,52 @@
+"""Tests of shift_stats: summary sheets must agree with detail sheets"""
+
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.database import conn_bd_oemz, bulk_insert, update_shift_stats
+from etl.vp import vp_load_state
+from report.vp import prep_detail_vptable, prep_gen_vptable
+
+
+def vp_operations(start1, periods1, seed1=0) -> pd.DataFrame:
+    """Операции линии каждые 7 минут, плети начинаются случайно, первые операции идут до начала плети"""
+    rng = np.random.default_rng(seed1)
+    table = pd.DataFrame({
+        'c_0': pd.date_range(start1, periods=periods1, freq='7min'),
+        'c_4': 'nomenclature',
+        'c_3': 'marka',
+        'c_9': rng.random(periods1) * 100,
+        'c_7': rng.integers(10, 700, periods1),  # часть операций длиннее 10 минут и обнуляется
+        'c_17': np.where(rng.random(periods1) < 0.1, 2, 1),
+    })
+    table.loc[:4, 'c_17'] = 1
+    return table
+
+
+def load_vp(name1, table1) -> None:
+    with conn_bd_oemz() as conn:
+        cur = conn.cursor()
+        vp_load_state(cur, name1)
+        bulk_insert(cur, name1, table1, columns1=list(table1.columns))
+        update_shift_stats(cur, name1, table1['c_0'].min())
+        conn.commit()
+
+
+@pytest.mark.parametrize('name', ['vp_164', 'vp_184'])
+def test_vp_summary_agrees_with_detail(name):
+    operations = vp_operations(dt.datetime.combine(dt.date.today() - dt.timedelta(days=10), dt.time(5)), 1900)
+    for part in np.array_split(np.arange(len(operations)), 7):  # загрузки разрезают плети и границы смен
+        load_vp(name, operations.iloc[part])
+
+    detail = prep_detail_vptable(name)
+    detail['plets'] = detail['ind_plet']
+    expected = detail.groupby(['date', 'smena'])[['mass', 'dur_oper', 'plets']].sum()
+    expected['dur_oper'] += expected['plets'] * 73 / (24 * 60 * 60)
+    expected.index = expected.index.set_levels(pd.to_datetime(expected.index.levels[0]), level='date')
+
+    gen = prep_gen_vptable(name).set_index(['date', 'smena']).reindex(expected.index)
+    pd.testing.assert_series_equal(gen['mass'], expected['mass'], check_names=False)
+    pd.testing.assert_series_equal(gen['dur_oper'], expected['dur_oper'], check_names=False)
@@ -0,0 +1,77 @@
+"""Tests of etl.vp: reading boundaries of VP report files"""
+
+import codecs
+import datetime as dt
+import os
+
+import pandas as pd
+
+from common.common import parse_date_path
+from etl import vp
+from etl.vp import vp_files_to_read
+
+codecs.register(lambda name: codecs.lookup('cp1251') if name == 'ansi' else None)  # 'ansi' есть только на Windows
+
+NOW = dt.datetime(2026, 10, 18, 12, 0)
+
+
+def vp_file(folder1, name1, data1, mtime1=NOW):
+    path = str(folder1 / name1)
+    with open(path, 'wb') as f:
+        f.write(data1)
+    os.utime(path, (mtime1.timestamp(), mtime1.timestamp()))
+    return path
+
+
+def table_files(*paths):
+    return pd.DataFrame({'path': paths, 'date': [parse_date_path(i) for i in paths]})
+
+
+def inbase_files(*rows):
+    return pd.DataFrame(list(rows), columns=['path', 'size_db', 'mtime_db', 'byte_offset'])
+
+
+def test_past_day_file_without_trailing_newline_is_read_to_the_end(tmp_path):
+    path = vp_file(tmp_path, '17_10_2026.txt', b'a;b\r\nc;d')
+    files = vp_files_to_read(table_files(path), inbase_files(), now1=NOW)
+    assert files[['start_offset', 'end_offset']].values.tolist() == [[0, 8]]
+
+
+def test_loaded_past_day_file_tail_is_revisited(tmp_path):
+    path = vp_file(tmp_path, '17_10_2026.txt', b'a;b\r\nc;d')
+    files = vp_files_to_read(table_files(path), inbase_files((path, 8, NOW.timestamp(), 5)), now1=NOW)
+    assert files[['start_offset', 'end_offset']].values.tolist() == [[5, 8]]
+
+    files = vp_files_to_read(table_files(path), inbase_files((path, 8, NOW.timestamp(), 8)), now1=NOW)
+    assert files.empty
+
+
+def test_todays_file_is_read_to_the_last_newline(tmp_path):
+    path = vp_file(tmp_path, '18_10_2026.txt', b'a;b\r\nc;d')
+    files = vp_files_to_read(table_files(path), inbase_files(), now1=NOW)
+    assert files[['start_offset', 'end_offset']].values.tolist() == [[0, 5]]
+
+
+def test_idle_todays_file_is_read_to_the_end(tmp_path):
+    path = vp_file(tmp_path, '18_10_2026.txt', b'a;b\r\nc;d', mtime1=NOW - dt.timedelta(hours=2))
+    files = vp_files_to_read(table_files(path), inbase_files(), now1=NOW)
+    assert files[['start_offset', 'end_offset']].values.tolist() == [[0, 8]]
+
+
+def vp_line(time1):
+    return f' 17.10.2020 ;nomenclature;marka;1;2;3; {time1} ;4\r\n'.encode()
+
+
+def test_same_second_row_appended_to_tracked_file_is_loaded(tmp_path, monkeypatch):
+    loaded = vp_line('10:00:00') + vp_line('10:00:01')
+    path = vp_file(tmp_path, '17_10_2020.txt', loaded + vp_line('10:00:01'))
+    monkeypatch.setattr(vp, 'load_list_files_vp', lambda name1: table_files(path))
+
+    last_date = dt.datetime(2020, 10, 17, 10, 0, 1)
+    done_table, _ = vp.prepare_vp_data(
+        'vp_164', last_date, inbase_files((path, len(loaded), NOW.timestamp(), len(loaded)))
+    )
+    assert done_table[0].tolist() == [pd.Timestamp(last_date)]
+
+    done_table, _ = vp.prepare_vp_data('vp_164', last_date, inbase_files())  # файла нет в vp_files
+    assert done_table.empty